@@ -1,93 +1,209 @@
 from collections import Counter
 import ast
+import json
+import subprocess
 import sys
+from functools import partial
 from pathlib import Path
 
-from utils import parser, SOURCES, RESULTS, base_init
+from utils import parser, SOURCES, RESULTS, base_init, open_outputs, pool_imap
+from store import ModuleStore
+from remove_hints import hints_record
+from resolver import ModuleIndex, LEGACY, MISSING
+from graph import DependencyGraph
+
+STATE = RESULTS / 'ast_imports_state.json'  # import records of the last run with commit of SOURCES
+
+
+def git(*args):
+    return subprocess.run(['git', '-C', str(SOURCES), *args], capture_output=True, text=True, check=True).stdout
 
-def check_legacy(module, collector):
-    module = Path(*module.split('.'))
-    legacy = SOURCES / module.parts[0]
-    if legacy.exists():
-        legacy = SOURCES / module
 
-        if legacy.exists(): # import from module,
-            legacy = legacy / '__init__.py'
-            return ast_module_loader(legacy, collector)
+def changed_files(commit):
+    """ absolute paths of files changed in SOURCES since commit, uncommitted and untracked files included """
+    root = Path(git('rev-parse', '--show-toplevel').strip())
+    names = git('diff', '--name-only', commit).splitlines() + git('ls-files', '--others', '--exclude-standard', '--full-name').splitlines()
+    return {(root / name).resolve() for name in names}
 
-        legacy = legacy.parent / f'{legacy.stem}.py'
-        if legacy.exists(): # import from file
-            return ast_module_loader(legacy, collector)
 
-        legacy = legacy.parent.parent / legacy.parent.stem
-        if legacy.exists():
-            legacy = legacy / '__init__.py'
-            return ast_module_loader(legacy, collector)
+def load_state():
+    """ import records of the previous run for files not changed since its commit and clean when it was saved """
+    if not STATE.exists():
+        print('no previous extraction, full extraction')
+        return {}
+    state = json.loads(STATE.read_text(encoding='utf-8'))
+    try:
+        changed = changed_files(state['commit'])
+    except (OSError, subprocess.CalledProcessError) as error:
+        print('can not ask git for changes, full extraction:', error)
+        return {}
+    changed.update(Path(name) for name in state.get('dirty', ()))  # records of them are not of the commit, their content is unknown
+    print('files changed since {}: {}'.format(state['commit'][:8], len(changed)))
+    return {name: records for name, records in state['records'].items() if Path(name).resolve() not in changed}
 
-        legacy = legacy.parent / f'{legacy.stem}.py'
-        if legacy.exists():
-            return ast_module_loader(legacy, collector)
 
+def save_state(records):
+    """ records with the commit of SOURCES and files which differ from it, they are parsed again by the next run """
+    try:
+        commit = git('rev-parse', 'HEAD').strip()
+        dirty = sorted(map(str, changed_files(commit)))
+    except (OSError, subprocess.CalledProcessError):
+        return  # SOURCES is not under git, incremental mode is not possible
+    STATE.write_text(json.dumps({'commit': commit, 'dirty': dirty, 'records': records}), encoding='utf-8')
 
-        raise Exception(f'Legacy module {module} not found')
-    check_requirements(legacy.stem, collector)
 
+def check_legacy(module, collector):
+    """ legacy file to load for the imported name, None for requirements """
+    kind, found = collector['index'].resolve(module)
+    if kind == LEGACY:
+        return found
+    if kind == MISSING:
+        raise Exception(f'Legacy module {found} not found')
+    check_requirements(found, collector)
 
 
 def check_requirements(module, collector):
     collector['requirements'].update([module])
 
 
-def extract_imports(filepath):
-    for node in ast.walk(ast.parse(filepath.read_text(), filepath.name)):
+def extract_imports(filepath, store=None):
+    store = store or ModuleStore()
+    for node in ast.walk(store[filepath].tree):
         if isinstance(node, (ast.Import, ast.ImportFrom)):
             absolute_path = ''
             if getattr(node, 'level', None):
                 absolute_path = '.'.join(filepath.absolute().relative_to(SOURCES.absolute()).parts[0:- node.level])
             yield type(node).__name__, node, absolute_path
 
-def ast_module_loader(module, collector):
+def import_records(filepath, store=None):
+    """ picklable imports of the file: (node class name, module, ((name, asname), ...), absolute package path) """
+    return [(node_cls, getattr(node, 'module', None), tuple((name.name, name.asname) for name in node.names), absolute_path) for node_cls, node, absolute_path in extract_imports(filepath, store)]
+
+def frontier_records(filepath, hints=False):
+    """ worker job: import records of the file, with hints record of it too, the file is parsed once for both """
+    store = ModuleStore()
+    return import_records(filepath, store), hints_record(filepath, store) if hints else None
+
+def parse_frontier(frontier, collector, jobs=1):
+    """
+    import records of frontier files, not known yet, are parsed in `jobs` worker processes at once,
+    hints records made by workers are kept in the store for hints_collector
+    """
+    cache, store = collector['cache'], collector['store']
+    known = (collector['previous'], collector['records'], collector['parsed'])
+    modules = [module for module in dict.fromkeys(frontier) if not any(str(module) in records for records in known)]
+    if cache is not None:
+        digests = {module: cache.digest(module, 'imports', str(SOURCES.absolute()), store[module].source) for module in modules}
+        modules = [module for module in modules if digests[module] not in cache]
+    for module, (records, hints) in zip(modules, pool_imap(partial(frontier_records, hints=collector['hints']), modules, jobs)):
+        collector['parsed'][str(module)] = records
+        if hints is not None:
+            store[module].results['hints'] = hints
+        if cache is not None:
+            cache.set(digests[module], records, 'imports', module)
 
+def read_imports(module, collector):
+    """ import records of module: read already in this run, of the previous run, parsed by workers, cached or parsed here """
+    records = collector['records'].get(str(module))
+    if records is not None:
+        return records
+    records = collector['previous'].get(str(module))
+    if records is None:
+        records = collector['parsed'].pop(str(module), None)
+    if records is None:
+        cache, store = collector['cache'], collector['store']
+        if cache is None:
+            records = import_records(module, store)
+        else:
+            records = cache.fetch(module, 'imports', partial(import_records, store=store), options=str(SOURCES.absolute()), content=store[module].source)
+    if collector['stream']:
+        collector['stream'].emit({'kind': 'imports', 'path': str(module), 'depth': collector['depth'][str(module)], 'imports': records})
+    collector['records'][str(module)] = records
+    return records
+
+def ast_module_loader(module, collector):
+    """ count imports of module, legacy modules imported by names not seen before are returned to be loaded next """
     imports = collector['imported'][str(module)] = collector['imported'].get(str(module)) or {'classes': {}, 'modules': Counter()}
+    discovered = []
 
-    for node_cls, node, absolute_path in extract_imports(module):
+    for node_cls, node_module, names, absolute_path in read_imports(module, collector):
         if node_cls == 'ImportFrom':
-            node_module = node.module
             if absolute_path:
                 node_module = '.'.join((absolute_path, node_module))
             imports['modules'].update([node_module])
             if f'{node_module}'.startswith('importlib'):
                 print('importlib detected', module)
-            for name in node.names:
-                imports['classes'][name.asname if name.asname else name.name] = node_module
-                new_module = f'{node_module}.{name.name}'
+            for name, asname in names:
+                imports['classes'][asname if asname else name] = node_module
+                new_module = f'{node_module}.{name}'
                 collector['imports'].update([new_module])
                 if collector['imports'][new_module] == 1:
-                    check_legacy(new_module, collector)
+                    discovered.append(check_legacy(new_module, collector))
         elif node_cls == 'Import':
-            for name in node.names:
-                node_name = name.name
+            for name, asname in names:
+                node_name = name
                 if absolute_path:
                     node_name = '.'.join((absolute_path, node_name))
                 if f'{node_name}'.startswith('importlib'):
                     print('importlib detected', module)
                 collector['imports'].update([node_name])
                 imports['modules'].update([node_name])
-                imports['classes'][name.asname if name.asname else name.name] = node_name
+                imports['classes'][asname if asname else name] = node_name
                 if collector['imports'][node_name] == 1:
-                    check_legacy(f'{node_name}', collector)
-def extract_all_imports(paths=None):
+                    discovered.append(check_legacy(f'{node_name}', collector))
+    return [legacy for legacy in discovered if legacy]
+
+def load_closure(modules, collector, jobs=1):
+    """
+    Load modules and legacy modules they import, in BFS order with a worklist instead of recursion.
+    Depth of module is the number of imports from given modules, the whole frontier of a depth is parsed by the pool.
+    """
+    frontier, depth = list(modules), 0
+    while frontier:
+        if jobs > 1:
+            parse_frontier(frontier, collector, jobs)
+        discovered = []
+        for module in frontier:
+            collector['depth'].setdefault(str(module), depth)
+            discovered.extend(ast_module_loader(module, collector))
+        frontier, depth = discovered, depth + 1
+    return collector
+
+def extract_all_imports(paths=None, cache=None, incremental=False, stream=None, store=None, jobs=1, hints=False):
+    """
+    Collect imports of paths and of legacy modules they use.
+    In incremental mode only files changed since the previous run are parsed again,
+    resolution of imports is replayed for all files, so files depending on changed ones are updated too.
+    Imports of every file are emitted to JSONLines stream as soon as the file is read.
+    Files are read and parsed through the ModuleStore, so later stages of the run can reuse them.
+    With jobs > 1 files are parsed in worker processes, their trees are not kept in the store,
+    with hints the workers collect hints of the files too, so hints_collector does not parse them again.
+    """
     base_init(RESULTS)
     paths = paths or [SOURCES]
     base_init(*paths)
     collector = {
         'imports': Counter(),
         'requirements': Counter(),
-        'imported': {} } # {'filename': {'classes': dict(), 'modules': Counter()}
+        'imported': {}, # {'filename': {'classes': dict(), 'modules': Counter()}
+        'depth': {},  # {'filename': number of imports from paths}
+        'cache': cache,
+        'stream': stream,
+        'store': store or ModuleStore(),
+        'index': ModuleIndex(SOURCES),  # after base_init, created __init__ files are indexed too, kept to resolve entry points
+        'previous': load_state() if incremental else {},  # {'filename': import records}
+        'records': {},
+        'hints': hints,  # workers collect hints records too
+        'parsed': {} }  # {'filename': import records parsed in worker processes}
 
 
-    for module in (filename for path in paths for filename in ([path] if path.is_file() else path.rglob('*.py'))):
-        ast_module_loader(module, collector)
+    load_closure((filename for path in paths for filename in ([path] if path.is_file() else path.rglob('*.py'))), collector, jobs)
+    collector['graph'] = DependencyGraph.build(collector['records'], collector['index'])
+    collector.pop('cache'), collector.pop('stream'), collector.pop('store'), collector.pop('parsed'), collector.pop('hints')
+    previous, records = collector.pop('previous'), collector.pop('records')
+    save_state(records)
+    if incremental:
+        print('files extracted again: {}'.format(len(set(records) - set(previous))))
 
     report = RESULTS / 'ast_imports_report.txt'
     with report.open(mode='w', encoding='utf-8') as destination:
@@ -109,6 +225,17 @@ def extract_all_imports(paths=None):
             destination.writelines([f'{counter} {name}\n'])
 
 
+    graph = collector['graph']
+    cycles = sorted(graph.cycles(), key=len, reverse=True)
+    cuts = 0
+    report = RESULTS / 'ast_cycles_report.txt'
+    with report.open(mode='w', encoding='utf-8') as destination:
+        for cycle in cycles:
+            destination.writelines([f'{len(cycle)} {", ".join(sorted(graph.names[id] for id in cycle))}\n'])
+            for source, target in graph.back_edges(cycle):
+                cuts += 1
+                destination.writelines([f'    cut {graph.names[source]} -> {graph.names[target]}\n'])
+
     required_modules = set(collector['requirements']).difference((*sys.stdlib_module_names, *sys.builtin_module_names))
     requirements = RESULTS / 'requirements.txt'
     with requirements.open(mode='w', encoding='utf-8', newline='\n') as destination:
@@ -116,6 +243,8 @@ def extract_all_imports(paths=None):
             destination.writelines([f'{module}', '\n'])
 
     print('find {} dependencies'.format(len(collector['imported'])))
+    print('max import depth {}'.format(max(collector['depth'].values(), default=0)))
+    print('find {} import cycles, {} imports to cut'.format(len(cycles), cuts))
     print('find {} libraries to install'.format(len(required_modules)))
     print('find {} built-in dependencies'.format(len(collector['imports']) - len(required_modules) - len(collector['imported'])))
     print('search of dependencies finished')
@@ -126,4 +255,5 @@ def extract_all_imports(paths=None):
 
 if __name__ == '__main__':
     init_args = parser.parse_args()
-    extract_all_imports(init_args.filenames)
\ No newline at end of file
+    with open_outputs(init_args) as (stream, cache):
+        extract_all_imports(init_args.filenames, cache, init_args.incremental, stream, jobs=init_args.jobs)
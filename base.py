@@ -1,10 +1,164 @@
 from dataclasses import dataclass, field
 from pathlib import Path
+from array import array
 import ast
+import tokenize
 from collections import Counter
 
 import argparse
+import inspect
 import sys
+from contextlib import closing, contextmanager
+from functools import partial
+
+from utils import pool_imap, JSONLines, records_stdout
+from cache import ResultCache
+
+def read_tree(path):
+    """ (source, tree) of the file, a file which can not be read or parsed is reported and analyzed as an empty module """
+    try:
+        source = path.read_text(encoding='utf-8')
+        return source, ast.parse(source, filename=str(path.absolute()))
+    except Exception as error:
+        print(f"Could not read or parse {path}: {error}", file=sys.stderr)
+        return '', ast.parse('"""Error"""', filename=str(path.absolute()))
+
+
+def start_line(node):
+    """ First source line of node with its decorators, same as ASTObject._start """
+    while not hasattr(node, 'lineno'):
+        if not getattr(node, 'body', None):
+            return 0
+        node = node.body[0]
+    decorators = getattr(node, 'decorator_list', None)
+    if decorators:
+        return node.lineno - (end_line(decorators[-1]) - max(0, start_line(decorators[0]) - 1))
+    return node.lineno
+
+
+def end_line(node):
+    """ Last source line of node, same as ASTObject._end """
+    while not getattr(node, 'end_lineno', None):
+        if not getattr(node, 'body', None):
+            return start_line(node)
+        node = node.body[-1]
+    return node.end_lineno
+
+
+class LineIndex:
+    """
+    Source lines of a file scanned once into prefix sums of blank and comment lines,
+    so counts for any range of lines are O(1).
+    Comment line is a line with only a comment token, `#` inside strings and trailing comments are code.
+    """
+    __slots__ = 'blank', 'comment'
+
+    def __init__(self, source_lines):
+        comments = self.comment_lines(source_lines)
+        self.blank, self.comment = array('l', [0]), array('l', [0])
+        for number, line in enumerate(source_lines, 1):
+            self.blank.append(self.blank[-1] + (not line.strip()))
+            self.comment.append(self.comment[-1] + (number in comments))
+
+    @staticmethod
+    def comment_lines(source_lines):
+        lines = iter(f'{line}\n' for line in source_lines)
+        try:
+            return {start[0] for kind, __, start, __, line in tokenize.generate_tokens(lambda: next(lines, '')) if kind == tokenize.COMMENT and not line[:start[1]].strip()}
+        except (tokenize.TokenError, SyntaxError):
+            return {number for number, line in enumerate(source_lines, 1) if line.strip().startswith('#')}
+
+    def _range(self, prefix, start, end):
+        """ count in lines start..end, numbered from 1, like source_lines[max(0, start - 1): end] """
+        size = len(prefix) - 1
+        low, high = min(max(0, start - 1), size), min(max(0, end), size)
+        return max(0, prefix[high] - prefix[low])
+
+    def spaces(self, start, end):
+        return self._range(self.blank, start, end)
+
+    def comments(self, start, end):
+        return self._range(self.comment, start, end)
+
+
+STATEMENTS = ast.stmt, ast.excepthandler, ast.match_case  # nodes wrapped in statements mode
+
+
+def is_docstring(node, parent):
+    """ same rule as stats.ASTObject.is_docstring """
+    body = getattr(parent, 'body', None)
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str) and bool(node.value.value) and isinstance(body, list) and body[0] is node
+
+
+class LogicalLines:
+    """
+    LLOC of nodes of one tree: the number of not blank lines ast.unparse would print for a node.
+    Statements are counted bottom-up in one pass over the tree, without unparsing:
+    one line per statement, clause header (else, finally, elif, except, case) and decorator,
+    multi-line docstrings add their lines. Expressions are one line, or none if unparse prints nothing.
+    """
+    __slots__ = 'tree', 'counts'
+    SCOPES = ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef  # nodes with docstring
+    EMPTY = ast.expr_context, ast.boolop, ast.operator, ast.unaryop, ast.cmpop, ast.type_ignore
+    QUOTES = '"""', "'''"
+    BLOCKS = 'body', 'orelse', 'finalbody', 'handlers', 'cases'  # statement lists
+
+    def __init__(self, tree):
+        self.tree = tree  # keeps nodes alive, counts are keyed by id of node
+        self.counts = {}
+        self.index(tree)
+
+    def __getitem__(self, node):
+        count = self.counts.get(id(node))
+        if count is not None:
+            return count
+        if isinstance(node, (ast.Module, *STATEMENTS)):
+            return self.index(node)
+        if isinstance(node, self.EMPTY) or isinstance(node, ast.arguments) and not any((node.posonlyargs, node.args, node.vararg, node.kwonlyargs, node.kwarg)):
+            return 0
+        return 1
+
+    def index(self, tree):
+        stack = [(tree, False)]
+        while stack:
+            node, ready = stack.pop()
+            if ready:
+                self.counts[id(node)] = self.count(node)
+                continue
+            stack.append((node, True))
+            for name in self.BLOCKS:
+                children = getattr(node, name, None)
+                if children:
+                    stack += [(child, False) for child in children]
+        return self.counts[id(tree)]
+
+    def block(self, nodes):
+        return sum(map(self.counts.__getitem__, map(id, nodes)))
+
+    def count(self, node):
+        lines = 0 if isinstance(node, ast.Module) else 1 + len(getattr(node, 'decorator_list', ()))
+        body = getattr(node, 'body', [])
+        lines += self.block(body)
+        if isinstance(node, self.SCOPES) and body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+            lines += self.docstring(body[0].value.value) - self.counts[id(body[0])]
+        orelse = getattr(node, 'orelse', [])
+        if isinstance(node, ast.If) and len(orelse) == 1 and isinstance(orelse[0], ast.If):
+            lines += self.counts[id(orelse[0])]  # elif
+        elif orelse:
+            lines += 1 + self.block(orelse)
+        finalbody = getattr(node, 'finalbody', [])
+        if finalbody:
+            lines += 1 + self.block(finalbody)
+        return lines + self.block(getattr(node, 'handlers', ())) + self.block(getattr(node, 'cases', ()))
+
+    @classmethod
+    def docstring(cls, value):
+        """ lines of docstring printed in triple quotes, only new lines stay unescaped """
+        if all(quote in value for quote in cls.QUOTES):
+            return 1  # printed by repr in one line
+        lines = value.split('\n')
+        return 1 + (len(lines) > 1) + sum(1 for line in lines[1:-1] if line.strip(' \t'))
+
 
 @dataclass
 class ASTObject:
@@ -14,7 +168,13 @@ class ASTObject:
     parent: 'ASTObject' = None
     path: Path = None  # where placed
     source_lines: list[str] = None # source file line per line content
-    children: list = field(default_factory=list)
+    _children: list = field(default_factory=list)
+    lazy: bool = False  # children are wrapped on first access, not in setup
+    statements: bool = False  # only statements are wrapped, expressions stay plain ast nodes
+    _materialized: bool = False
+    _lines: LineIndex = None
+    _logical: LogicalLines = None
+    _span: tuple = None  # (_start, _end)
 
     def __repr__(self):
         return f'{self.name} -> {self.reflection.__class__}'
@@ -28,18 +188,58 @@ class ASTObject:
 
     def setup(self):
         self.path = self.path or self.parent.path
-        for node in ast.iter_child_nodes(self.reflection):
-            self.collect(node)
+        if not self.lazy and not (self.parent and self.parent._materialized):  # nodes wrapped by a parent are materialized by its loop
+            self.materialize(deep=True)
+        return self
+
+    def materialize(self, deep=False):
+        """ wrap child nodes, once, deep: all nodes inside of them too, in preorder with a stack instead of recursion """
+        stack = []
+        if not self._materialized:
+            self._materialized = True
+            stack.append((self, ast.iter_child_nodes(self.reflection)))
+        while stack:
+            wrapper, nodes = stack[-1]
+            node = next(nodes, None)
+            if node is None:
+                stack.pop()
+            elif not self.statements or isinstance(node, STATEMENTS):
+                child = wrapper.collect(node)
+                if deep and not child._materialized:
+                    child._materialized = True
+                    stack.append((child, ast.iter_child_nodes(child.reflection)))
         return self
 
+    @property
+    def children(self):
+        return self.materialize()._children
+
+    @children.setter
+    def children(self, children):
+        self._children, self._materialized = children, True
+
     def collect(self, node):
-        self.children.append(type(self)(f'Child Node {node.__class__.__name__} of {self.name}', node, self).setup())
-        return self.children[-1]
+        self._children.append(type(self)(f'Child Node {node.__class__.__name__} of {self.name}', node, self, lazy=self.lazy, statements=self.statements).setup())
+        return self._children[-1]
 
     @property
     def source(self):
         return self.source_lines or (self.parent and self.parent.source) or []
 
+    @property
+    def lines(self):
+        """ LineIndex of the source file, shared by all nodes """
+        if self._lines is None:
+            self._lines = self.parent.lines if self.source_lines is None and self.parent else LineIndex(self.source)
+        return self._lines
+
+    @property
+    def logical(self):
+        """ LogicalLines of the tree, shared by all nodes """
+        if self._logical is None:
+            self._logical = self.parent.logical if self.parent else LogicalLines(self.reflection)
+        return self._logical
+
     @property
     def raw_lines(self):
         return self.source[max(0, self._start - 1): self._end]
@@ -65,50 +265,44 @@ class ASTObject:
 
     @property
     def code_weight(self):
-        return len(self.code)
+        return self.logical[self.reflection]  # same as len(self.code), without unparsing
     LLOC = code_weight # The number of logical lines of code
 
     def get_path(self):
         """ Path to source file containing this object """
         return self.path or self.parent.get_path()
 
+    @property
+    def span(self):
+        """ first and last source lines of node with decorators, computed on first access """
+        if self._span is None:
+            self._span = start_line(self.reflection), end_line(self.reflection)
+        return self._span
+
     @property
     def _end(self):
-        if hasattr(self.reflection, 'end_lineno') and self.reflection.end_lineno:
-            return self.reflection.end_lineno
-        if hasattr(self.reflection, 'body') and self.reflection.body:
-            return type(self)('test', self.reflection.body[-1], self)._end
-        return self._start
+        return self.span[1]
 
     @property
-    def decorators(self):
-        return type(self)('decorators', ast.stmt(body=self.reflection.decorator_list if self.is_decorated else []))
+    def _start(self):
+        return self.span[0]
 
     @property
     def is_decorated(self):
         return hasattr(self.reflection, 'decorator_list') and len(self.reflection.decorator_list)
 
     @property
-    def _start(self):
-        if hasattr(self.reflection, 'lineno'):
-            return self.reflection.lineno - (self.decorators.LOC if self.is_decorated else 0)
-        if hasattr(self.reflection, 'body') and self.reflection.body:
-            return type(self)('test', self.reflection.body[0], self)._start
-        return 0
+    def decorators_LOC(self):
+        """ source lines taken by decorators, before the def or class line """
+        return self.reflection.lineno - self._start if self.is_decorated else 0
 
     @property
-    def spaces(self, response = 0):
-        if self.source:
-            for line in self.raw_lines:
-                response += not len(line.strip())
-        return response
+    def spaces(self):
+        return self.lines.spaces(self._start, self._end)
 
     @property
-    def comments(self, response = 0):
-        if self.source:
-            for line in self.raw_lines:
-                response += line.strip().startswith('#')
-        return response
+    def comments(self):
+        return self.lines.comments(self._start, self._end)
 
     def _start_module(self, node):
         if self.collect_modules(node):
@@ -117,15 +311,14 @@ class ASTObject:
         return self
 
     @classmethod
-    def init(cls, path):
+    def init(cls, path, lazy=False, statements=False):
         path = Path(path)
-        try:
-            source = path.read_text(encoding='utf-8')
-            node = ast.parse(source, filename=str(path.absolute()))
-        except Exception as error:
-            print(f"Could not read or parse {path}: {error}", file=sys.stderr)
-            source, node = '', ast.parse('"""Error"""', filename=str(path.absolute()))
-        return cls('root', node, path=path, source_lines=source.splitlines()).setup()
+        source, node = read_tree(path)
+        return cls('root', node, path=path, source_lines=source.splitlines(), lazy=lazy, statements=statements).setup()
+
+    def record(self):
+        """ Compact picklable summary, workers return it instead of the whole tree """
+        return {'path': str(self.path), 'LOC': self.LOC, 'spaces': self.spaces, 'comments': self.comments, 'SLOC': self.SLOC, 'LLOC': self.LLOC, 'docstring': self.docstring}
 
     def render(self, ready=False):
         try:
@@ -135,7 +328,47 @@ class ASTObject:
         except:
             ...
 
+def analyze(cls, path, **options):
+    """ Worker entry point: parse path into cls tree and reduce it to the record """
+    return cls.init(path, **options).record()
+
+
+def analyze_cached(cache, cls, paths, jobs=1, **options):
+    """ records of unchanged files are taken from cache, only the rest is analyzed, records are yielded in order of paths """
+    namespace = f'{Path(sys.modules[cls.__module__].__file__).stem}.{cls.__qualname__}'
+    digests = [cache.digest(path, namespace, sorted(options.items())) for path in paths]
+    missing = {index for index, digest in enumerate(digests) if digest not in cache}
+    analyzed = pool_imap(partial(analyze, cls, **options), [paths[index] for index in sorted(missing)], jobs)
+    for index, digest in enumerate(digests):
+        yield cache.set(digest, next(analyzed), namespace, paths[index]) if index in missing else cache.get(digest)
+
+
+def analyze_all(cls, paths, jobs=1, cache=False, jsonl=None, **options):
+    """ records of paths, each one is yielded and written to jsonl stream as soon as it is ready """
+    with JSONLines(jsonl) as stream:
+        if not cache:
+            yield from stream.tee(pool_imap(partial(analyze, cls, **options), paths, jobs))
+            return
+        with ResultCache() as results:
+            yield from stream.tee(analyze_cached(results, cls, paths, jobs, **options))
+
+
+def collect_paths(paths, recursive=False):
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            if path.suffix == '.py':
+                yield path
+            else:
+                print(f"Skipping non-Python file: {path}")  # other files like stubs not implemented yet
+        elif path.is_dir():
+            template = '**/*.py' if recursive else '*.py'
+            yield from path.glob(template)
+
+
+@contextmanager
 def main(cls=ASTObject, args=None):
+    """ records of files given in command line arguments, for the with block of a CLI """
     args = args or sys.argv
     if len(args) < 2:
         print(f"Usage: {sys.argv[0]} <python_file.py>")
@@ -150,38 +383,35 @@ def main(cls=ASTObject, args=None):
     parser = argparse.ArgumentParser(prog='cognitive_complexity.py', description='Compute Cognitive Complexity (Sonar-like) for Python files.')
     parser.add_argument('paths', nargs='+', help='Python file(s) or directories to analyze.')
     parser.add_argument('--recursive', '-r', action='store_true', help='Recurse into directories.')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Analyze files in N worker processes. By default: %(default)s, analyze in current process.')
+    parser.add_argument('--cache', action='store_true', help='Reuse records of unchanged files stored in the results cache by previous runs.')
+    parser.add_argument('--jsonl', help='Stream one JSON record per file into this file as soon as it is analyzed, `-` for stdout, then other output goes to stderr.')
+    parser.add_argument('--lazy', action='store_true', help='Wrap child nodes only when they are used.')
+    parser.add_argument('--statements', action='store_true', help='Wrap only statements, not expressions. Metrics are the same, expressions are measured on their ast nodes.')
     args = parser.parse_args(args)
 
-    objects = []
-    for path in args.paths:
-        path = Path(path)
-        if path.is_file():
-            if path.suffix == '.py':
-                objects.append(cls.init(path))
-            else:
-                print(f"Skipping non-Python file: {path}")  # other files like stubs not implemented yet
-        elif path.is_dir():
-            template = '**/*.py' if args.recursive else '*.py'
-            for path in path.glob(template):
-                objects.append(cls.init(path))
-
-    return objects
+    supported = inspect.signature(cls.init).parameters  # tree options are passed only to classes built by ASTObject.init
+    options = {option: True for option in ('lazy', 'statements') if getattr(args, option) and option in supported}
+    jsonl, printed = records_stdout(args.jsonl)
+    with printed, closing(analyze_all(cls, list(collect_paths(args.paths, args.recursive)), args.jobs, args.cache, jsonl, **options)) as records:
+        yield records  # with `--jsonl -` stdout holds only the records until the CLI is done with them
 
 if __name__ == '__main__':
-    objects= main(ASTObject)
-
-    LOCs = Counter()
-    Compression = Counter()
-    for obj in objects:
-        print('LOC', obj.LOC)
-        print('blank lines', obj.spaces)
-        print('comments', obj.comments)
-        print('SLOC', obj.SLOC)
-        print('LLOC', obj.LLOC)
-        print('docsring', obj.docstring)
-
-        LOCs.update({str(obj.path): obj.LOC})
-        Compression.update({str(obj.path): int(obj.LOC/(obj.LLOC or 1))})
-
-    print('longest', LOCs.most_common(1))
-    print('max compression', Compression.most_common(1))
+    from nodes import NodeTable  # same records as ASTObject, without a wrapper per node, nodes imports base
+
+    with main(NodeTable) as records:
+        LOCs = Counter()
+        Compression = Counter()
+        for record in records:
+            print('LOC', record['LOC'])
+            print('blank lines', record['spaces'])
+            print('comments', record['comments'])
+            print('SLOC', record['SLOC'])
+            print('LLOC', record['LLOC'])
+            print('docsring', record['docstring'])
+
+            LOCs.update({record['path']: record['LOC']})
+            Compression.update({record['path']: int(record['LOC']/(record['LLOC'] or 1))})
+
+        print('longest', LOCs.most_common(1))
+        print('max compression', Compression.most_common(1))
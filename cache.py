@@ -0,0 +1,97 @@
+"""Persistent cache of per-file analysis results, keyed by file content hash, tool version and analysis options"""
+from hashlib import sha256
+from pathlib import Path
+import pickle
+import sqlite3
+
+from utils import RESULTS, VERSION
+
+MISSING = object()
+
+
+def code_version(version=VERSION):
+    """ VERSION with a digest of the sources of the tool, so results of changed analysis code are not used even if VERSION is not bumped """
+    key = sha256(version.encode())
+    for path in sorted(Path(__file__).parent.glob('*.py')):
+        key.update(path.read_bytes())
+    return f'{version}-{key.hexdigest()[:16]}'
+
+
+class ResultCache:
+    """
+    sqlite storage of picklable results: imports of file, hints of file, metrics records.
+    Results of changed file, other tool version or other options are never found, so no invalidation is needed.
+    Rows which can not be found any more are deleted: of other versions and of removed files when the cache is opened,
+    of older content of a file when a result for its new content is stored.
+    """
+
+    def __init__(self, path=None, version=None):
+        self.path = Path(path or RESULTS / 'cache.sqlite3')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.version = version or code_version()
+        self.connection = sqlite3.connect(self.path)
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(results)')}
+        if columns and 'content' not in columns:  # rows of an older layout
+            self.connection.execute('DROP TABLE results')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results (digest TEXT PRIMARY KEY, namespace TEXT, path TEXT, version TEXT, content TEXT, value BLOB)')
+        self.contents = {}  # {digest: digest of content} of digests made by this cache
+        self.hits = self.misses = 0
+        self.evict()
+
+    def evict(self):
+        """ delete rows of other versions and of files which do not exist """
+        self.connection.execute('DELETE FROM results WHERE version != ?', (self.version,))
+        removed = [(path,) for path, in self.connection.execute('SELECT DISTINCT path FROM results') if not Path(path).exists()]
+        self.connection.executemany('DELETE FROM results WHERE path = ?', removed)
+        self.connection.commit()
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def digest(self, path, namespace, options=(), content=None):
+        """ key of result: content of path, path itself, namespace of analysis, options and version """
+        content = sha256(Path(path).read_bytes() if content is None else content).hexdigest()
+        digest = sha256(f'{content}\0{path}\0{namespace}\0{options!r}\0{self.version}'.encode()).hexdigest()
+        self.contents[digest] = content
+        return digest
+
+    def __contains__(self, digest):
+        return self.connection.execute('SELECT 1 FROM results WHERE digest = ?', (digest,)).fetchone() is not None
+
+    def get(self, digest, default=MISSING):
+        row = self.connection.execute('SELECT value FROM results WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, digest, value, namespace='', path=''):
+        """ store value, results of other content of path in namespace are deleted, digest should be made by this cache """
+        path, content = str(Path(path).absolute()) if path else '', self.contents.get(digest, '')
+        if path:
+            self.connection.execute('DELETE FROM results WHERE namespace = ? AND path = ? AND content != ?', (namespace, path, content))
+        self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)', (digest, namespace, path, self.version, content, pickle.dumps(value)))
+        return value
+
+    def fetch(self, path, namespace, compute, options=(), content=None):
+        """ compute(path) only if result for current content of path is not stored, content can be given if it is already read """
+        digest = self.digest(path, namespace, options, content)
+        value = self.get(digest)
+        if value is MISSING:
+            value = self.set(digest, compute(path), namespace, path)
+        return value
+
+    def clear(self, namespace=None):
+        if namespace is None:
+            self.connection.execute('DELETE FROM results')
+        else:
+            self.connection.execute('DELETE FROM results WHERE namespace = ?', (namespace,))
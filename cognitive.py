@@ -8,6 +8,9 @@ from pathlib import Path
 
 from collections import defaultdict
 
+VISITORS = {}  # class of visitor: {class of node: visit method or None}, looked up once per class
+
+
 @dataclass
 class ASTObject(baseASTObject):
     nesting_penalty: int = 0
@@ -55,6 +58,7 @@ class ASTObject(baseASTObject):
         self.calls = defaultdict(set)        # caller-qualified-name -> set(callee_simple_names)
         self.func_nodes = {}                 # qualified_name -> ast.FunctionDef
         self._func_stack = []                # stack of function names for qualification
+        self._stack = []                     # (visit method or action, node or argument, nesting level) to be called
 
     # --------------- bookkeeping ----------------
     @property
@@ -63,23 +67,52 @@ class ASTObject(baseASTObject):
 
     @property
     def cognitive_complexity(self):
-        if self._func_complexities is None:
-            if not self.is_docstring:
-                self.visit(self.reflection)
-                for child in self.children:
-                    self.func_complexities.update(child.CgC or {})
-            self._func_complexities = self.func_complexities
+        """ complexities of functions of the node updated by ones of its children, children are computed first with a stack instead of recursion """
+        stack = [(self, False)]
+        while stack:
+            node, ready = stack.pop()
+            if node._func_complexities is not None:
+                continue
+            if ready:
+                node.visit(node.reflection)
+                for child in node.children:
+                    node.func_complexities.update(child._func_complexities)
+                node._func_complexities = node.func_complexities
+            elif node.is_docstring:
+                node._func_complexities = node.func_complexities
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children)
         return self._func_complexities
         # return self.local_cg_complexity + sum(child.cognitive_complexity for child in self.children)
     CgC = cognitive_complexity
 
     def visit(self, node):
-        """Visit a node."""
-        method = 'visit_' + node.__class__.__name__
-        if hasattr(self, method):
-            getattr(self, method)(node)
+        """Visit a node and nodes inside of it with an explicit stack instead of recursion, nesting level is carried by the stack."""
+        nesting, depth = self._nesting, len(self._stack)
+        self.push((nesting, [node]))
+        self.walk(depth)
+        self._nesting = nesting
         return self
 
+    def push(self, *groups):
+        """Schedule (nesting level, nodes) groups to be visited in order, nodes without visit method are skipped."""
+        stack, visitors = self._stack, VISITORS.setdefault(type(self), {})
+        for nesting, nodes in reversed(groups):
+            for node in reversed(nodes):
+                kind = type(node)
+                if kind not in visitors:
+                    visitors[kind] = getattr(type(self), f'visit_{kind.__name__}', None)
+                if visitors[kind] is not None:
+                    stack.append((visitors[kind], node, nesting))
+
+    def walk(self, depth=0):
+        """Call scheduled visit methods and actions until the stack is back to depth."""
+        stack = self._stack
+        while len(stack) > depth:
+            method, argument, self._nesting = stack.pop()
+            method(self, argument)
+
     def _enter_function(self, name, node):
         # if name == 'visit_Call':
         #     ...
@@ -116,64 +149,41 @@ class ASTObject(baseASTObject):
         name = self._qualify_name(node.name)
         self.func_nodes[name] = node
         prev = self._enter_function(name, node)
-        # Visit defaults, decorators, body
-        for arg in node.args.defaults:
-            self.visit(arg)
-        for decorator in node.decorator_list:
-            self.visit(decorator)
-        for statement in node.body:
-            self.visit(statement)
-        self._exit_function(prev)
+        # Visit defaults, decorators, body, then leave the function
+        self._stack.append((type(self)._exit_function, prev, self._nesting))
+        self.push((self._nesting, [*node.args.defaults, *node.decorator_list, *node.body]))
 
     def visit_Lambda(self, node):
-        # Lambda doesn't get structural increment but acts like nested method: increases nesting temporarily
-        old_nesting = self._nesting
+        # Lambda doesn't get structural increment but acts like nested method: increases nesting of its nodes
         if self._nesting >= 0:
             self._nesting += 1
         self.generic_visit(node)
-        self._nesting = old_nesting
 
     def visit_If(self, node):
-        # 'if' is structural: +1 + nesting penalty
+        # 'if' is structural: +1 + nesting penalty, body with nesting increased
         self._struct_incr(1)
-        # Visit body with nesting increased
-        self.visit(node.test)
-        self._nesting += 1
-        for stmt in node.body:
-            self.visit(stmt)
-        self._nesting -= 1
+        nesting = self._nesting
+        groups = [(nesting, [node.test]), (nesting + 1, node.body)]
 
         # Handle orelse: elif chains or else branch are hybrid increments and increase nesting for their bodies
-        while hasattr(node, 'orelse') and node.orelse:
+        while node.orelse:
             node, *body = node.orelse
             self._hybrid_incr(1)
             if isinstance(node, ast.If):
                 # 'elif' as If in orelse: hybrid increment (+1), body gets nesting+1
-                self.visit(node.test)
-                self._nesting += 1
-                for stmt in node.body:
-                    self.visit(stmt)
-                self._nesting -= 1
+                groups += (nesting, [node.test]), (nesting + 1, node.body)
             else:
-                self._nesting += 1
-                for stmt in [node, *body]:
-                    self.visit(stmt)
-                self._nesting -= 1
-                node = None # like break
-
-    def visit_loop(self, node):
-        for stmt in node.body:
-            self.visit(stmt)
-        self._nesting -= 1
-        for stmt in node.orelse:
-            self.visit(stmt)
+                groups.append((nesting + 1, [node, *body]))
+                break
+        self.push(*groups)
 
-    def visit_For(self, node):
+    def visit_loop(self, node, *heads):
+        # loop is structural, heads and body are nested, else of loop is not
         self._struct_incr(1)
-        self._nesting += 1
-        self.visit(node.target)
-        self.visit(node.iter)
-        self.visit_loop(node)
+        self.push((self._nesting + 1, [*heads, *node.body]), (self._nesting, node.orelse))
+
+    def visit_For(self, node):
+        self.visit_loop(node, node.target, node.iter)
 
     def visit_AsyncFor(self, node):
         self.visit_For(node)
@@ -182,33 +192,22 @@ class ASTObject(baseASTObject):
         self.generic_visit(node)
 
     def visit_While(self, node):
-        self._struct_incr(1)
-        self._nesting += 1
-        self.visit(node.test)
-        self.visit_loop(node)
+        self.visit_loop(node, node.test)
 
     def visit_Try(self, node):
         # try itself ignored; each except handler is structural (+1) and its body is nested
-        for stmt in node.body:
-            self.visit(stmt)
+        groups = [(self._nesting, node.body)]
         for handler in node.handlers:
             self._struct_incr(1)
-            self._nesting += 1
-            for stmt in handler.body:
-                self.visit(stmt)
-            self._nesting -= 1
-        for stmt in node.orelse:
-            self.visit(stmt)
-        for stmt in node.finalbody:
-            self.visit(stmt)
+            groups.append((self._nesting + 1, handler.body))
+        self.push(*groups, (self._nesting, node.orelse), (self._nesting, node.finalbody))
 
     def visit_BoolOp(self, node):
         # For N operands, N-1 binary ops -> add N-1
         n_operands = len(node.values)
         if n_operands > 1:
             self._local_complexity += (n_operands - 1)
-        for v in node.values:
-            self.visit(v)
+        self.push((self._nesting, node.values))
 
     def visit_IfExp(self, node):
         self._struct_incr(1)
@@ -236,7 +235,7 @@ class ASTObject(baseASTObject):
     def visit_Return(self, node):
         # Sonar: early return doesn't add complexity. Still visit value.
         if node.value:
-            self.visit(node.value)
+            self.push((self._nesting, [node.value]))
 
     def visit_Break(self, node):
         # should be counted as a labeled break, for reason that break is like goto behind else block.
@@ -250,14 +249,15 @@ class ASTObject(baseASTObject):
         self.generic_visit(node)
 
     def generic_visit(self, node):
-        """Called if no explicit visitor function exists for a node."""
-        for __, value in ast.iter_fields(node):
+        """Schedule all nodes inside of node on the same nesting level."""
+        nodes = []
+        for name in node._fields:  # same nodes as ast.iter_child_nodes
+            value = getattr(node, name, None)
             if isinstance(value, ast.AST):
-                value = [value]
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, ast.AST):
-                        self.visit(item)
+                nodes.append(value)
+            elif isinstance(value, list):
+                nodes += [item for item in value if isinstance(item, ast.AST)]
+        self.push((self._nesting, nodes))
 
     def visit_Module(self, node):
         # Collect top-level functions first (helps callgraph mapping)
@@ -266,7 +266,9 @@ class ASTObject(baseASTObject):
                 qual = self._qualify_name(n.name)
                 self.func_nodes[qual] = n
         # Generic visit to collect calls & compute complexity
+        depth = len(self._stack)
         self.generic_visit(node)
+        self.walk(depth)
         # After traversal, detect recursion cycles and add +1 to participants
         self._apply_recursion_bonus()
 
@@ -334,6 +336,10 @@ class ASTObject(baseASTObject):
                 if v in graph and v in graph[v]:
                     self.func_complexities[v] = self.func_complexities.get(v, 0) + 1
 
+    def record(self):
+        func_map, total = analyze_source(self)
+        return {'path': str(self.path), 'total': total, 'functions': func_map}
+
 
 def analyze_source(obj):
     result = obj.CgC
@@ -345,17 +351,11 @@ def analyze_source(obj):
 
 # CLI behavior
 if __name__ == '__main__':
-    objects = main(ASTObject)
-
-    grand_total = 0
-    per_file = {}
-    for obj in objects:
-        func_map, total = analyze_source(obj)
-        per_file[str(obj.path)] = {'total': total, 'functions': func_map}
-        grand_total += total
-
-    for fname, data in per_file.items():
-        print(f'File: {fname}  Total cognitive complexity: {data["total"]}')
-        for func, c in data['functions'].items():
-            print(f'  {func}: {c}')
-    print(f'Grand total: {grand_total}')
\ No newline at end of file
+    with main(ASTObject) as records:
+        grand_total = 0
+        for record in records:  # printed as soon as file is analyzed
+            grand_total += record['total']
+            print(f'File: {record["path"]}  Total cognitive complexity: {record["total"]}')
+            for func, c in record['functions'].items():
+                print(f'  {func}: {c}')
+        print(f'Grand total: {grand_total}')
\ No newline at end of file
@@ -2,13 +2,13 @@ from dataclasses import dataclass, field
 from pathlib import Path
 import ast
 
-from .base import ASTObject as baseASTObject
+from base import ASTObject as baseASTObject
 
-from halstead import HalsteadVisitor
+from halstead import HalsteadMemo
 
 
 @dataclass
-class ASTObject(baseASTObject):
+class ASTObject(HalsteadMemo, baseASTObject):
     """ Base wrapper for AST Node for complexity measurements"""
     PIPELINE = 'collect_modules', 'collect_imports', 'collect_classes', 'collect_functions', 'collect_constants', 'collect_values'
 
@@ -184,13 +184,6 @@ class ASTObject(baseASTObject):
     def _N2(self):
         return self.halstead['N2']
 
-    @property
-    def halstead(self):
-        cache = getattr(self, '_cache', None)
-        if not cache:
-            cache = HalsteadVisitor(self.reflection, exclude_docstrings=True, )
-        return cache.halstead
-
     def get_path(self):
         return self.path or self.parent.get_path()
 
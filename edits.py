@@ -0,0 +1,60 @@
+"""Replacements in source bytes positioned like ast nodes, collected from several passes and applied in one pass"""
+
+BOM = b'\xef\xbb\xbf'
+
+
+def line_starts(source):
+    """ offset of every line in source bytes, columns of ast nodes are counted from them """
+    position = len(BOM) if source.startswith(BOM) else 0
+    starts = [position]
+    for line in source[position:].splitlines(keepends=True):
+        position += len(line)
+        starts.append(position)
+    return starts
+
+
+class EditBuffer:
+    """
+    Edits of one source: (start, end, replacement) offsets of the original bytes,
+    so edits of several passes compose without knowing about each other.
+    Positions of ast nodes are (lineno, col_offset), columns are utf-8 bytes like in ast, nodes can span lines.
+    apply writes the new source at once into a preallocated buffer.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.starts = line_starts(source)
+        self.edits = []
+
+    def __len__(self):
+        return len(self.edits)
+
+    def offset(self, lineno, col_offset):
+        return self.starts[lineno - 1] + col_offset
+
+    def span(self, node):
+        """ (start, end) offsets of ast node """
+        return self.offset(node.lineno, node.col_offset), self.offset(node.end_lineno, node.end_col_offset)
+
+    def text(self, start, end):
+        return self.source[start:end]
+
+    def replace(self, start, end, replacement=b''):
+        self.edits.append((start, end, replacement))
+        return self
+
+    def apply(self):
+        """ new source, edits are applied in order of position, overlapping edits are an error """
+        edits = sorted(self.edits)
+        size = len(self.source) + sum(len(replacement) - end + start for start, end, replacement in edits)
+        source, output = memoryview(self.source), bytearray(size)
+        position = written = 0
+        for start, end, replacement in edits:
+            if start < position:
+                raise ValueError(f'Edit of {start}:{end} overlaps an edit ending at {position}')
+            for piece in (source[position:start], replacement):
+                output[written:written + len(piece)] = piece
+                written += len(piece)
+            position = end
+        output[written:] = source[position:]
+        return bytes(output)
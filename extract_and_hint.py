@@ -4,13 +4,15 @@ from pathlib import Path
 from remove_hints import hints_collector
 from ast_extractor import extract_all_imports
 
-from utils import parser, RESULTS
+from utils import parser, RESULTS, open_outputs
+from store import ModuleStore
 
 
-def extract_and_hint(paths=None):
-    collected_deps = extract_all_imports(paths)
+def extract_and_hint(paths=None, cache=None, incremental=False, stream=None, store=None, jobs=1):
+    store = store or ModuleStore()  # files parsed for imports are reused for hints, with jobs > 1 workers collect the hints
+    collected_deps = extract_all_imports(paths, cache, incremental, stream, store, jobs, hints=True)
     paths = [Path(path) for path in collected_deps['imported'].keys()]
-    collected_hints = hints_collector(paths)
+    collected_hints = hints_collector(paths, cache, stream, store)
 
     type_hints_counter = {key:val for key, val in collected_hints.items() if len(val)}
     refactor_collector = {}
@@ -33,4 +35,5 @@ def extract_and_hint(paths=None):
 
 if __name__ == '__main__':
     init_args = parser.parse_args()
-    extract_and_hint(init_args.filenames)
\ No newline at end of file
+    with open_outputs(init_args) as (stream, cache):
+        extract_and_hint(init_args.filenames, cache, init_args.incremental, stream, jobs=init_args.jobs)
@@ -2,8 +2,11 @@ import importlib
 import ast
 from pathlib import Path
 import sys
+from argparse import ArgumentParser
 from unittest.mock import Mock
 
+from utils import pool_map
+
 SOURCES = Path('legacy_strip_hints/')
 IMPORTS = Path('src/imports/')
 REQUIREMENTS = IMPORTS / 'requirements/'
@@ -114,9 +117,13 @@ def extract_imports(filepath):
         if isinstance(node, (ast.Import, ast.ImportFrom)):
             yield node
 
-def ast_module_loader(module):
-    for node in extract_imports(module):
-        print(type(node).__name__, getattr(node, 'module', None), [(name.name, name.asname) for name in node.names])
+def import_lines(module):
+    """ picklable import records of module, for a worker process """
+    return [(type(node).__name__, getattr(node, 'module', None), [(name.name, name.asname) for name in node.names]) for node in extract_imports(module)]
+
+def ast_module_loader(module, lines=None):
+    for line in import_lines(module) if lines is None else lines:
+        print(*line)
 
 def module_loader(module):
     success = False
@@ -153,14 +160,19 @@ def module_loader(module):
 
 
 if __name__ == '__main__':
+    cli = ArgumentParser(prog='extractor.py', description='Print imports of the modules')
+    cli.add_argument('--jobs', '-j', type=int, default=1, help='Parse modules in N worker processes. By default: %(default)s.')
+    init_args = cli.parse_args()
+
     sys.path.insert(0, str(FAKE.absolute()))
 
     base_init(MODULES, FAKE, IMPORTS, REQUIREMENTS)
     print('legacy stats', len([file for file in SOURCES.rglob('*.py')]))
 
-    for module in MODULES.rglob('*.py'):
+    modules = list(MODULES.rglob('*.py'))
+    for module, lines in zip(modules, pool_map(import_lines, modules, init_args.jobs)):
         # module_loader(module)
-        ast_module_loader(module)
+        ast_module_loader(module, lines)
 
     counter = len(list(FAKE.rglob('*.py')))
 
@@ -0,0 +1,234 @@
+"""Import graph of legacy files with names interned to integer IDs and adjacency stored in CSR arrays"""
+from array import array
+
+from resolver import LEGACY, MISSING
+
+
+def imported_names(records):
+    """ (name bound in the file, module it is bound to, dotted name to resolve) of import records, like ast_extractor.ast_module_loader """
+    for node_cls, node_module, names, absolute_path in records:
+        if node_cls == 'ImportFrom':
+            if absolute_path:
+                node_module = '.'.join((absolute_path, node_module))
+            for name, asname in names:
+                yield asname or name, node_module, f'{node_module}.{name}'
+        elif node_cls == 'Import':
+            for name, asname in names:
+                node_name = '.'.join((absolute_path, name)) if absolute_path else name
+                yield asname or name, node_name, node_name
+
+
+class DependencyGraph:
+    """
+    Files and requirements are nodes, node i has name names[i], only nodes have rows in the CSR arrays.
+    Imports of node i are targets[offsets[i]:offsets[i + 1]], importers of it are
+    sources[reverse_offsets[i]:reverse_offsets[i + 1]].
+    Names bound by imports of node i are symbols[symbol_offsets[i]:symbol_offsets[i + 1]],
+    in the same slice of bound are modules they are bound to, of files are legacy files they come from (-1 for requirements)
+    and of members are names inside of these files (-1 if the name is the file module itself).
+    Names of nodes are interned to ids, names of symbols, modules and members to ids of their own table symbol_names.
+    """
+    __slots__ = 'names', 'ids', 'symbol_names', 'symbol_ids', 'offsets', 'targets', 'reverse_offsets', 'sources', 'symbol_offsets', 'symbols', 'bound', 'files', 'members'
+    WHOLE = None  # file is needed with all its imports
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.symbol_names = []
+        self.symbol_ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id
+
+    def intern_symbol(self, name):
+        id = self.symbol_ids.get(name)
+        if id is None:
+            id = self.symbol_ids[name] = len(self.symbol_names)
+            self.symbol_names.append(name)
+        return id
+
+    @staticmethod
+    def compress(size, pairs):
+        """ CSR offsets and values of (row, value) pairs """
+        offsets = array('i', [0]) * (size + 1)
+        for row, __ in pairs:
+            offsets[row + 1] += 1
+        for row in range(size):
+            offsets[row + 1] += offsets[row]
+        values, position = array('i', [0]) * len(pairs), offsets[:-1]
+        for row, value in pairs:
+            values[position[row]] = value
+            position[row] += 1
+        return offsets, values
+
+    @classmethod
+    def build(cls, records, index):
+        """
+        Graph of import records {'filename': records} of ast_extractor,
+        dotted names are resolved by ModuleIndex: to legacy files or to top level requirements.
+        """
+        graph = cls()
+        edges, bindings = {}, []  # dict keeps first seen order of unique edges
+        for filename, file_records in records.items():
+            source = graph.intern(filename)
+            for symbol, module, name in imported_names(file_records):
+                kind, found = index.resolve(name)
+                target = member = -1
+                if kind != MISSING:
+                    edges[source, graph.intern(str(found))] = None
+                if kind == LEGACY:
+                    target = graph.intern(str(found))
+                    member = -1 if index.member(name) is None else graph.intern_symbol(index.member(name))
+                bindings.append((source, (graph.intern_symbol(symbol), graph.intern_symbol(module), target, member)))
+        size = len(graph.names)
+        graph.offsets, graph.targets = cls.compress(size, list(edges))
+        graph.reverse_offsets, graph.sources = cls.compress(size, [(target, source) for source, target in edges])
+        graph.symbol_offsets, order = cls.compress(size, [(source, index) for index, (source, __) in enumerate(bindings)])
+        graph.symbols, graph.bound, graph.files, graph.members = (array('i', (bindings[index][1][field] for index in order)) for field in range(4))
+        return graph
+
+    def imports(self, id):
+        return self.targets[self.offsets[id]:self.offsets[id + 1]]
+
+    def importers(self, id):
+        return self.sources[self.reverse_offsets[id]:self.reverse_offsets[id + 1]]
+
+    def dependencies(self, name):
+        return [self.names[id] for id in self.imports(self.ids[name])]
+
+    def dependents(self, name):
+        """ reverse dependencies: files importing name """
+        return [self.names[id] for id in self.importers(self.ids[name])]
+
+    def bindings(self, name):
+        """ {symbol: module} like collector['imported'][name]['classes'] """
+        id = self.ids[name]
+        start, end = self.symbol_offsets[id], self.symbol_offsets[id + 1]
+        return {self.symbol_names[symbol]: self.symbol_names[module] for symbol, module in zip(self.symbols[start:end], self.bound[start:end])}
+
+    def subset(self, entries):
+        """
+        Files needed to run entries, (file name, name in the file or None for the whole file), graph is not changed.
+        Names imported from a package __init__ are followed to the files the package re-exports them from,
+        so the __init__ needs only these imports, not the whole package.
+        Returns {file name: WHOLE or set of re-exported names needed from the __init__}.
+        """
+        needed, work = {}, [(self.ids[name], -1 if member is None else self.symbol_ids.get(member, -1)) for name, member in entries]  # unknown member: whole file
+        while work:
+            id, member = work.pop()
+            current = needed.get(id, False)
+            if current is self.WHOLE:
+                continue
+            start, end = self.symbol_offsets[id], self.symbol_offsets[id + 1]
+            if member >= 0 and self.names[id].endswith('__init__.py'):
+                sources = [index for index in range(start, end) if self.symbols[index] == member]
+                if sources:  # re-exported name, not defined in the __init__
+                    needed[id] = current or set()
+                    if member not in needed[id]:
+                        needed[id].add(member)
+                        work.extend((self.files[index], self.members[index]) for index in sources if self.files[index] >= 0)
+                    continue
+            needed[id] = self.WHOLE
+            work.extend((self.files[index], self.members[index]) for index in range(start, end) if self.files[index] >= 0)
+        return {self.names[id]: value if value is self.WHOLE else {self.symbol_names[member] for member in value} for id, value in needed.items()}
+
+    def reachable(self, ids, reverse=False):
+        """ ids of nodes reachable from ids, ids themselves only if they are in a cycle """
+        offsets, targets = (self.reverse_offsets, self.sources) if reverse else (self.offsets, self.targets)
+        seen, found = bytearray(len(self.names)), []
+        stack = list(ids)
+        while stack:
+            id = stack.pop()
+            for target in targets[offsets[id]:offsets[id + 1]]:
+                if not seen[target]:
+                    seen[target] = 1
+                    found.append(target)
+                    stack.append(target)
+        return found
+
+    def closure(self, name, reverse=False):
+        """ names of all modules name depends on, directly or not; with reverse all modules depending on name """
+        return [self.names[id] for id in self.reachable([self.ids[name]], reverse)]
+
+    def components(self):
+        """ strongly connected components of the graph, iterative Tarjan, each one is a list of ids """
+        size = len(self.names)
+        order, low = array('i', [-1]) * size, array('i', [0]) * size
+        on_stack, stack, components, counter = bytearray(size), [], [], 0
+        for root in range(size):
+            if order[root] >= 0:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, self.offsets[root])]
+            while work:
+                id, position = work[-1]
+                if position < self.offsets[id + 1]:
+                    work[-1] = id, position + 1
+                    target = self.targets[position]
+                    if order[target] < 0:
+                        order[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, self.offsets[target]))
+                    elif on_stack[target]:
+                        low[id] = min(low[id], order[target])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[id])
+                if low[id] == order[id]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == id:
+                            break
+                    components.append(component)
+        return components
+
+    def cycles(self):
+        """ components of import cycles: more than one module, or a module importing itself """
+        return [component for component in self.components() if len(component) > 1 or component[0] in self.imports(component[0])]
+
+    def back_edges(self, component):
+        """
+        Edges to cut to break the cycles of component: edges to an ancestor in iterative DFS over the component.
+        Without them the component has no cycle, it is an upper bound of the minimal set.
+        """
+        members = set(component)
+        state = dict.fromkeys(component, 0)  # 0 not visited, 1 on DFS path, 2 done
+        cut = []
+        for root in component:
+            if state[root]:
+                continue
+            state[root] = 1
+            work = [(root, self.offsets[root])]
+            while work:
+                id, position = work[-1]
+                if position == self.offsets[id + 1]:
+                    state[id] = 2
+                    work.pop()
+                    continue
+                work[-1] = id, position + 1
+                target = self.targets[position]
+                if target not in members:
+                    continue
+                if state[target] == 1:
+                    cut.append((id, target))
+                elif not state[target]:
+                    state[target] = 1
+                    work.append((target, self.offsets[target]))
+        return cut
@@ -1,8 +1,11 @@
 """a set of software metrics developed by Maurice Halstead to measure code complexity based on the number of operators and operands in the source code"""
 import math
-from collections import Counter
+from array import array
+from hashlib import blake2b
+from collections import Counter, defaultdict
 from dataclasses import dataclass, field
 import ast
+from base import is_docstring
 from stats import ASTObject as baseASTObject, main
 from pathlib import Path
 
@@ -26,37 +29,100 @@ transformer = {
     'ast.AugAssign.LShift': '<<=', 'ast.AugAssign.RShift': '>>=',
 }
 
+def measures(operators, operands):
+    """ Halstead metrics derived from operators and operands counters """
+    halstead = { 'operands': operands, 'operators': operators, 'n1': len(operators), 'n2': len(operands), 'N1': sum(operators.values()), 'N2': sum(operands.values())}
+
+    n1, n2, N1, N2 = halstead['n1'], halstead['n2'], halstead['N1'], halstead['N2']
+    n, N = n1 + n2, N1 + N2
+    volume = N * math.log2(n or 1)
+    difficulty = n1 and n2 and ((n1 / 2.0) * (N2 / n2)) or 0
+    effort = difficulty * volume
+    halstead.update(vocabulary = n, length = N, volume = volume, difficulty = difficulty, effort = effort)
+    return halstead
+
+
+class Tokens:
+    """
+    Interning table of one run: every operator and operand gets a small int id, counters of all engines are keyed by ids.
+    Literals longer than LIMIT are keyed by length and digest of their text, only a short preview named by the digest is kept.
+    Names of tokens are materialized only for reports.
+    """
+    LIMIT = 64
+    PREVIEW = 24
+
+    def __init__(self):
+        self.ids = defaultdict()
+        self.ids.default_factory = self.ids.__len__  # a new token gets the next id
+        self.keys, self.previews = [], {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, token):
+        return self.ids[token]
+
+    def literal(self, value):
+        """ id of constant value, text of the operand is f'{value}' like for other operands """
+        text = value if type(value) is str else f'{value}'
+        if len(text) <= self.LIMIT:
+            return self.ids[text]
+        key = len(text), blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        if key not in self.ids:
+            self.previews[self.ids[key]] = f'{text[:self.PREVIEW]}...<{len(text)} chars {key[1][:4].hex()}>'
+        return self.ids[key]
+
+    def name(self, id):
+        if len(self.keys) != len(self.ids):
+            self.keys = list(self.ids)  # tokens in order of ids
+        return self.previews.get(id, self.keys[id])
+
+    def named(self, counter):
+        """ counter of ids as counter of names, for reports """
+        return Counter({self.name(id): count for id, count in counter.items()})
+
+
+TOKENS = Tokens()
+
 @dataclass
-class ASTObject(baseASTObject):
-    exclude_docstring: bool = True # skip docstring from complexity or not
-    operators: Counter[str] = field(default_factory=Counter)  # imported
-    operands: Counter[str] = field(default_factory=Counter)
+class HalsteadMemo:
+    """ Halstead metrics of a node wrapper with reflection and parent, memoized per node, counts of the tree are shared by all its nodes """
+    tokens: Tokens = None  # interning table of the run, given to the root, TOKENS by default
+    _counts: 'HalsteadCounts' = None
+    _halstead: dict = None
+
+    @property
+    def table(self):
+        """ Tokens of the tree, shared by all nodes """
+        if self.tokens is None:
+            self.tokens = self.parent.table if self.parent else TOKENS
+        return self.tokens
+
+    @property
+    def counts(self):
+        """ HalsteadCounts of the tree, shared by all nodes """
+        if self._counts is None:
+            self._counts = self.parent.counts if self.parent else HalsteadCounts(self.reflection, tokens=self.table)
+        return self._counts
 
     @property
     def halstead(self):
-        if not getattr(self, '_halstead', None):
-            # derive metrics from counters
-            # for operator in list(self.operators_counter):
-            #     if operator in transformer:
-            #         self.operators_counter[transformer[operator]] = self.operators_counter.pop(operator)
-
-            if not self.is_docstring:
-                self.visit(self.reflection)
-                for halstead in [children.halstead for children in self.children]:
-                    self.operands.update(halstead['operands'])
-                    self.operators.update(halstead['operators'])
-
-
-            halstead = self._halstead = { 'operands': self.operands, 'operators': self.operators, 'n1': len(self.operators), 'n2': len(self.operands), 'N1': sum(self.operators.values()), 'N2': sum(self.operands.values())}
-
-            n1, n2, N1, N2 = halstead['n1'], halstead['n2'], halstead['N1'], halstead['N2']
-            n, N = n1 + n2, N1 + N2
-            volume = N * math.log2(n or 1)
-            difficulty = n1 and n2 and ((n1 / 2.0) * (N2 / n2)) or 0
-            effort = difficulty * volume
-            halstead.update(vocabulary = n, length = N, volume = volume, difficulty = difficulty, effort = effort)
+        """ metrics of the node with all nodes inside of it, docstrings are skipped """
+        if self._halstead is None:
+            self._halstead = self.counts.measures(self.reflection)
         return self._halstead
 
+
+@dataclass
+class ASTObject(HalsteadMemo, baseASTObject):
+    exclude_docstring: bool = True # skip docstring from complexity or not
+    operators: Counter[int] = field(default_factory=Counter)  # ids of tokens of the table
+    operands: Counter[int] = field(default_factory=Counter)
+
+    def record(self):
+        scopes = [{'name': name, 'kind': type(node).__name__, 'lineno': getattr(node, 'lineno', 0), 'halstead': {key: value for key, value in measured.items() if key not in ('operands', 'operators')}} for name, node, measured in self.counts.scopes()]
+        return {'path': str(self.path), 'halstead': {key: value for key, value in self.halstead.items() if key not in ('operands', 'operators')}, 'scopes': scopes}
+
     def visit(self, node):
         """Visit a node."""
         method = 'visit_' + node.__class__.__name__
@@ -66,10 +132,13 @@ class ASTObject(baseASTObject):
 
     # helpers
     def add_op(self, *args):
-        self.operators.update(args)
+        self.operators.update(map(self.table.__getitem__, args))
 
     def add_operand(self, *args):
-        self.operands.update(args)
+        self.operands.update(map(self.table.__getitem__, args))
+
+    def add_literal(self, value):
+        self.operands[self.table.literal(value)] += 1
 
     # Operand visitors
     def visit_Name(self, node: ast.Name):
@@ -77,7 +146,7 @@ class ASTObject(baseASTObject):
 
     def visit_Constant(self, node: ast.Constant):
         # Constants are operands; docstrings are skipped at parent level
-        self.add_operand(f'{node.value}')
+        self.add_literal(node.value)
 
     def visit_arg(self, node: ast.arg):
         # Parameter name counts as operand
@@ -195,7 +264,7 @@ class ASTObject(baseASTObject):
                 values[idx] = f'{value.value}'
 
         self.add_op('f')
-        self.add_operand(''.join(values))
+        self.add_literal(''.join(values))
 
     def visit_Call(self, node: ast.Call):
         self.add_op('call')
@@ -329,16 +398,101 @@ class ASTObject(baseASTObject):
         ...
 
 
+@dataclass
+class TokenSink(ASTObject):
+    """ visitor of ASTObject writing tokens of visited nodes to HalsteadCounts instead of counters """
+    target: 'HalsteadCounts' = None
+
+    def add_op(self, *args):
+        self.target.operators.extend(map(self.target.tokens.ids.__getitem__, args))
+
+    def add_operand(self, *args):
+        self.target.operands.extend(map(self.target.tokens.ids.__getitem__, args))
+
+    def add_literal(self, value):
+        self.target.operands.append(self.target.tokens.literal(value))
+
+
+class HalsteadCounts:
+    """
+    Operators and operands of all nodes of one tree, visited once, without counters copied from children to parents.
+    Tokens are interned to ids of tokens, TOKENS by default, and written in preorder, so tokens of any subtree are slices of the operators and operands arrays:
+    ranges[id(node)] is (operators start, operands start, operators end, operands end).
+    Docstrings are skipped with their subtrees like in ASTObject.halstead.
+    """
+    __slots__ = 'tree', 'tokens', 'operators', 'operands', 'ranges'
+    SCOPES = ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef
+    EMPTY = 0, 0, 0, 0
+
+    def __init__(self, tree, exclude_docstrings=True, tokens=None):
+        self.tree = tree  # keeps nodes alive, ranges are keyed by id of node
+        self.tokens = TOKENS if tokens is None else tokens
+        self.operators, self.operands = array('i'), array('i')
+        self.ranges = {}
+        self.index(tree, exclude_docstrings)
+
+    def index(self, tree, exclude_docstrings=True):
+        sink, ranges, operators, operands = TokenSink('tokens', tree, target=self), self.ranges, self.operators, self.operands
+        visitors = {}  # node class: visit method of sink or None, looked up once per class
+        stack = [(tree, None)]
+        while stack:
+            node, parent = stack.pop()
+            if parent is self:  # all nodes inside of node are visited
+                ranges[id(node)] += len(operators), len(operands)
+                continue
+            if exclude_docstrings and type(node) is ast.Expr and is_docstring(node, parent):
+                continue
+            ranges[id(node)] = len(operators), len(operands)
+            kind = type(node)
+            if kind not in visitors:
+                visitors[kind] = getattr(sink, f'visit_{kind.__name__}', None)
+            if visitors[kind] is not None:
+                visitors[kind](node)
+            stack.append((node, self))
+            for name in node._fields:  # children pushed directly, no generator per node
+                value = getattr(node, name, None)
+                if isinstance(value, ast.AST):
+                    stack.append((value, node))
+                elif isinstance(value, list):
+                    stack.extend((item, node) for item in value if isinstance(item, ast.AST))
+        return self
+
+    def measures(self, node):
+        """ Halstead metrics of node with all nodes inside of it, operators and operands are counters of ids of tokens """
+        operators_start, operands_start, operators_end, operands_end = self.ranges.get(id(node), self.EMPTY)
+        return measures(Counter(self.operators[operators_start:operators_end]), Counter(self.operands[operands_start:operands_end]))
+
+    def scopes(self):
+        """ (qualified name, node, metrics) of the module, its classes and functions, nested ones are named through their parents """
+        stack = [(self.tree, 'module')]
+        while stack:
+            node, name = stack.pop()
+            yield name, node, self.measures(node)
+            prefix = '' if node is self.tree else f'{name}.'
+            stack.extend((child, f'{prefix}{child.name}') for child in reversed(list(self.nested(node))))
+
+    def nested(self, node):
+        """ classes and functions inside of node, not inside of other classes and functions, in order of source """
+        stack = list(ast.iter_child_nodes(node))[::-1]
+        while stack:
+            child = stack.pop()
+            if isinstance(child, self.SCOPES):
+                yield child
+            else:
+                stack.extend(list(ast.iter_child_nodes(child))[::-1])
+
+
 if __name__ == '__main__':
-    objects= main(ASTObject)
-    vocabulary = Counter()
-    difficulty = Counter()
-    for obj in objects:
-        halstead = obj.halstead
-        vocabulary.update({str(obj.path): halstead['vocabulary']})
-        difficulty.update({str(obj.path): int(halstead['difficulty'])})
-
-    most_common = 1
-    print('objects researched:', len(objects))
-    print('variative files:', vocabulary.most_common(most_common))
-    print('hardest to maintain:', difficulty.most_common(most_common))
\ No newline at end of file
+    with main(ASTObject) as records:
+        vocabulary = Counter()
+        difficulty = Counter()
+        researched = 0
+        for researched, record in enumerate(records, 1):
+            halstead = record['halstead']
+            vocabulary.update({record['path']: halstead['vocabulary']})
+            difficulty.update({record['path']: int(halstead['difficulty'])})
+
+        most_common = 1
+        print('objects researched:', researched)
+        print('variative files:', vocabulary.most_common(most_common))
+        print('hardest to maintain:', difficulty.most_common(most_common))
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Halstead metrics derived at once for all functions of a repository, with NumPy if it is installed"""
+from array import array
+import heapq
+import math
+
+try:
+    import numpy
+except ImportError:  # metrics are derived by python loops
+    numpy = None
+
+from halstead import ASTObject
+from base import main
+
+FUNCTIONS = 'FunctionDef', 'AsyncFunctionDef'
+
+
+class HalsteadBatch:
+    """
+    n1, n2, N1 and N2 of many scopes in integer columns, one row per scope.
+    Derived metrics of all rows are computed together: vocabulary, length, volume, difficulty, effort,
+    time in seconds (effort / 18) and delivered bugs (volume / 3000), same formulas as halstead.measures.
+    """
+    COUNTS = 'n1', 'n2', 'N1', 'N2'
+    METRICS = 'vocabulary', 'length', 'volume', 'difficulty', 'effort', 'time', 'bugs'
+
+    def __init__(self):
+        self.names = []
+        self.counts = {column: array('i') for column in self.COUNTS}
+        self._metrics = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, halstead):
+        self.names.append(name)
+        for column in self.COUNTS:
+            self.counts[column].append(halstead[column])
+        self._metrics = None
+        return self
+
+    @classmethod
+    def from_records(cls, records, kinds=FUNCTIONS):
+        """ rows of scopes of kinds in records of halstead or metrics, named path:qualified name """
+        batch = cls()
+        for record in records:
+            for scope in record['scopes']:
+                if scope['kind'] in kinds:
+                    batch.add(f'{record["path"]}:{scope["name"]}', scope['halstead'])
+        return batch
+
+    @property
+    def metrics(self):
+        """ {metric: column of values}, numpy arrays or lists without numpy """
+        if self._metrics is None:
+            self._metrics = self._vectorized() if numpy is not None else self._looped()
+        return self._metrics
+
+    def _vectorized(self):
+        n1, n2, N1, N2 = (numpy.frombuffer(self.counts[column], dtype=numpy.intc).astype(numpy.float64) for column in self.COUNTS)
+        vocabulary, length = n1 + n2, N1 + N2
+        volume = length * numpy.log2(numpy.maximum(vocabulary, 1))
+        difficulty = numpy.zeros_like(volume)
+        measured = (n1 > 0) & (n2 > 0)
+        difficulty[measured] = (n1[measured] / 2.0) * (N2[measured] / n2[measured])
+        effort = difficulty * volume
+        return dict(vocabulary=vocabulary, length=length, volume=volume, difficulty=difficulty, effort=effort, time=effort / 18, bugs=volume / 3000)
+
+    def _looped(self):
+        metrics = {metric: [] for metric in self.METRICS}
+        for n1, n2, N1, N2 in zip(*(self.counts[column] for column in self.COUNTS)):
+            n, N = n1 + n2, N1 + N2
+            volume = N * math.log2(n or 1)
+            difficulty = n1 and n2 and ((n1 / 2.0) * (N2 / n2)) or 0
+            effort = difficulty * volume
+            for metric, value in zip(self.METRICS, (n, N, volume, difficulty, effort, effort / 18, volume / 3000)):
+                metrics[metric].append(value)
+        return metrics
+
+    def percentiles(self, metric, q=(50, 90, 99)):
+        """ {percent: value} of metric, linear interpolation like numpy.percentile """
+        values = self.metrics[metric]
+        if not len(values):
+            return {}
+        if numpy is not None:
+            return dict(zip(q, numpy.percentile(values, q).tolist()))
+        values = sorted(values)
+        result = {}
+        for percent in q:
+            position = (len(values) - 1) * percent / 100
+            low = math.floor(position)
+            high = min(low + 1, len(values) - 1)
+            result[percent] = values[low] + (values[high] - values[low]) * (position - low)
+        return result
+
+    def top(self, metric, k=10):
+        """ [(name, value)] of k rows with the biggest metric, biggest first """
+        values = self.metrics[metric]
+        k = min(k, len(values))
+        if not k:
+            return []
+        if numpy is None:
+            return [(self.names[index], values[index]) for index in heapq.nlargest(k, range(len(values)), key=values.__getitem__)]
+        indexes = numpy.argpartition(-values, k - 1)[:k]
+        indexes = indexes[numpy.argsort(-values[indexes], kind='stable')]
+        return [(self.names[index], value) for index, value in zip(indexes.tolist(), values[indexes].tolist())]
+
+
+if __name__ == '__main__':
+    with main(ASTObject) as records:
+        batch = HalsteadBatch.from_records(records)
+        print('functions researched:', len(batch), 'in files:', len({name.rpartition(':')[0] for name in batch.names}))
+        for metric in ('volume', 'effort', 'bugs'):
+            print(f'{metric} percentiles:', batch.percentiles(metric))
+        print('hardest to maintain:', batch.top('effort', 5))
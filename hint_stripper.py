@@ -0,0 +1,66 @@
+"""Type hints stripped in process: every file is read, parsed and written once, fields of dataclasses keep their hints"""
+from pathlib import Path
+import ast
+
+from edits import EditBuffer
+from remove_hints import hint_annotations
+from utils import parser, RESULTS, base_init, pool_imap
+
+
+def annotation_end(source, opened, end):
+    """ end of annotation with closing parentheses of the ones opened before it, ast position of annotation is inside of them """
+    for __ in range(opened):
+        end = source.index(b')', end) + 1
+    return end
+
+
+def hint_edits(buffer, tree):
+    """ edits of buffer removing every hint of tree """
+    source = buffer.source
+    for node, annotation in hint_annotations(tree):
+        start, end = buffer.span(annotation)
+        if isinstance(node, ast.AnnAssign) and node.value is None:  # x: int, the statement is needed only for the hint
+            buffer.replace(*buffer.span(node), b'pass')
+            continue
+        if isinstance(node, ast.arg):
+            colon = source.index(b':', buffer.offset(node.lineno, node.col_offset) + len(node.arg.encode()))
+        elif isinstance(node, ast.AnnAssign):
+            colon = source.index(b':', buffer.span(node.target)[1])
+        else:  # returns of function
+            colon = source.rindex(b'->', 0, start)
+            while source[colon - 1:colon] in (b' ', b'\t'):
+                colon -= 1
+        buffer.replace(colon, annotation_end(source, source.count(b'(', colon, start), end))
+    return buffer
+
+
+def strip_hints(path):
+    """ strip hints of one file in place: (number of stripped hints, error message or None) """
+    try:
+        buffer = EditBuffer(Path(path).read_bytes())
+        hint_edits(buffer, ast.parse(buffer.source, filename=str(path)))
+        if buffer:
+            Path(path).write_bytes(buffer.apply())
+    except (OSError, SyntaxError, ValueError) as error:
+        return 0, f'{error}'
+    return len(buffer), None
+
+
+def hints_stripper(paths, jobs=1):
+    """ strip hints of files in `jobs` worker processes, paths of files which can not be stripped are returned """
+    paths = list(paths)
+    stripped, errors = 0, []
+    for path, (count, error) in zip(paths, pool_imap(strip_hints, paths, jobs)):
+        stripped += count
+        if error:
+            print('error', error, path)
+            errors.append(str(path))
+    print('type hints stripped', stripped, 'in files', len(paths))
+    return errors
+
+
+if __name__ == '__main__':
+    init_args = parser.parse_args()
+    base_init(RESULTS)
+    errors = hints_stripper((filename for path in init_args.filenames for filename in ([path] if path.is_file() else Path(path).rglob('*.py'))), init_args.jobs)
+    (RESULTS / 'errors_strip_hints.txt').write_text('\n'.join(errors), newline='\n')
@@ -0,0 +1,250 @@
+"""Fused metrics engine: raw, Halstead, cyclomatic and cognitive metrics of every module, class and function in one tree walk"""
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+import ast
+
+from base import main, read_tree, start_line, end_line, is_docstring, LineIndex, LogicalLines
+from halstead import ASTObject as HalsteadSink, measures
+from mc_cabe_openai import COMPLEXITY_NODES, COMPREHENSION_NODES
+
+SCOPES = ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef
+
+
+@dataclass
+class Scope:
+    """ module, class or function with its collected metrics """
+    name: str
+    reflection: ast.AST = None
+    parent: 'Scope' = None
+    metrics: dict = field(default_factory=dict)
+    state: dict = field(default_factory=dict)  # accumulators working data, dropped after the walk
+
+    @property
+    def kind(self):
+        return self.reflection.__class__.__name__
+
+    def qualify(self, name):
+        return name if self.parent is None else f'{self.name}.{name}'
+
+
+class Accumulator:
+    """
+    Metric plugged into the fused walk.
+    visit receives the state given by the parent node and returns (default, overrides),
+    the state for every child of the node and the states of particular children.
+    """
+    name = ''
+
+    def start(self, scope, lines):
+        ...
+
+    def visit(self, node, state, scope):
+        return state, {}
+
+    def finish(self, scope):
+        ...
+
+
+class RawMetrics(Accumulator):
+    """ LOC, blank lines, comments, SLOC and LLOC like base.ASTObject """
+    name = 'raw'
+
+    def start(self, scope, lines):
+        logical = scope.state[self.name] = scope.parent.state[self.name] if scope.parent else LogicalLines(scope.reflection)  # one per file
+        start, end = start_line(scope.reflection), end_line(scope.reflection)
+        spaces, comments = lines.spaces(start, end), lines.comments(start, end)
+        LOC = end - max(0, start - 1)
+        LLOC = logical[scope.reflection]
+        scope.metrics.update(LOC=LOC, spaces=spaces, comments=comments, SLOC=LOC - comments - spaces, LLOC=LLOC)
+
+
+class HalsteadMetrics(Accumulator):
+    """ Halstead metrics like halstead.ASTObject, nested scopes are merged into the parent """
+    name = 'halstead'
+
+    def start(self, scope, lines):
+        scope.state[self.name] = HalsteadSink('fused', scope.reflection)
+
+    def visit(self, node, state, scope):
+        scope.state[self.name].visit(node)
+        return state, {}
+
+    def finish(self, scope):
+        sink = scope.state[self.name]
+        scope.metrics[self.name] = {key: value for key, value in measures(sink.operators, sink.operands).items() if key not in ('operands', 'operators')}
+        if scope.parent:
+            scope.parent.state[self.name].operators.update(sink.operators)
+            scope.parent.state[self.name].operands.update(sink.operands)
+
+
+class CyclomaticMetrics(Accumulator):
+    """ McCabe complexity like mc_cabe_openai.cyclomatic_complexity, state is the scope owning the decisions """
+    name = 'cyclomatic'
+
+    def start(self, scope, lines):
+        scope.metrics[self.name] = 1
+
+    @staticmethod
+    def decisions(node):
+        if isinstance(node, COMPLEXITY_NODES) or isinstance(node, (ast.ExceptHandler, ast.Assert)):
+            return 1
+        if isinstance(node, ast.BoolOp):
+            return max(0, len(node.values) - 1)
+        if isinstance(node, COMPREHENSION_NODES):
+            return sum(1 + len(generator.ifs) for generator in node.generators)
+        return 0
+
+    def visit(self, node, owner, scope):
+        if isinstance(node, SCOPES):
+            return scope, {}
+        if isinstance(node, ast.Lambda):
+            return None, {}  # lambda is a leaf for mc cabe, its decisions are not counted
+        if owner is not None:
+            owner.metrics[self.name] += self.decisions(node)
+        return owner, {}
+
+
+class CognitiveMetrics(Accumulator):
+    """
+    Cognitive complexity of functions, same numbers as cognitive.ASTObject.CgC reports for function names.
+    State is (function scope, nesting, mode), None for nodes cognitive visitor does not reach.
+    Classes and modules get the sum of their functions.
+    """
+    name = 'cognitive'
+    VISITED = ast.Expr, ast.Compare, ast.Call, ast.Assign, ast.Attribute, ast.Raise, ast.Return
+
+    def start(self, scope, lines):
+        scope.metrics[self.name] = 0
+        scope.state[self.name] = 0  # nested functions total
+
+    def finish(self, scope):
+        total = scope.state[self.name]
+        if not isinstance(scope.reflection, ast.FunctionDef):
+            scope.metrics[self.name] = total
+        if scope.parent:
+            scope.parent.state[self.name] += total + (scope.metrics[self.name] if isinstance(scope.reflection, ast.FunctionDef) else 0)
+
+    @staticmethod
+    def _states(function, nesting, nodes):
+        return {node: (function, nesting, 'visit') for node in nodes}
+
+    def _orelse(self, node, function, nesting):
+        if node.orelse and isinstance(node.orelse[0], ast.If):
+            return {node.orelse[0]: (function, nesting, 'elif')}  # like elif, rest of else block is skipped
+        return self._states(function, nesting + 1, node.orelse)
+
+    def visit(self, node, state, scope):
+        if isinstance(node, ast.FunctionDef):
+            nesting = 0 if state is None else 1  # reached by the visit of the enclosing function, like cognitive _enter_function
+            return None, {node.args: (scope, nesting, 'defaults'), **self._states(scope, nesting, (*node.decorator_list, *node.body))}
+        if state is None or isinstance(node, SCOPES):
+            return None, {}
+        function, nesting, mode = state
+        metrics = function.metrics
+
+        if mode == 'defaults':
+            return None, self._states(function, nesting, node.defaults)
+        if mode == 'handler':
+            metrics[self.name] += 1 + nesting
+            return None, self._states(function, nesting + 1, node.body)
+        if isinstance(node, ast.If):
+            metrics[self.name] += (1 + nesting if mode == 'visit' else 0) + bool(node.orelse)
+            return None, {**self._states(function, nesting, (node.test,)), **self._states(function, nesting + 1, node.body), **self._orelse(node, function, nesting)}
+        if isinstance(node, (ast.For, ast.AsyncFor)):
+            metrics[self.name] += 1 + nesting
+            return None, {**self._states(function, nesting + 1, (node.target, node.iter, *node.body)), **self._states(function, nesting, node.orelse)}
+        if isinstance(node, ast.While):
+            metrics[self.name] += 1 + nesting
+            return None, {**self._states(function, nesting + 1, (node.test, *node.body)), **self._states(function, nesting, node.orelse)}
+        if isinstance(node, ast.Try):
+            handlers = {handler: (function, nesting, 'handler') for handler in node.handlers}
+            return None, {**self._states(function, nesting, (*node.body, *node.orelse, *node.finalbody)), **handlers}
+        if isinstance(node, ast.BoolOp):
+            metrics[self.name] += max(0, len(node.values) - 1)
+            return state, {}
+        if isinstance(node, ast.IfExp):
+            metrics[self.name] += 1 + nesting
+            return state, {}
+        if isinstance(node, ast.Lambda):
+            return (function, nesting + 1, 'visit'), {}
+        if isinstance(node, self.VISITED):
+            return state, {}
+        return None, {}
+
+
+ACCUMULATORS = RawMetrics, HalsteadMetrics, CyclomaticMetrics, CognitiveMetrics
+
+
+@dataclass
+class Metrics:
+    """ All scopes of a file with metrics, collected in one walk of its tree """
+    path: Path = None
+    scopes: list = field(default_factory=list)
+    accumulators: tuple = ()
+
+    @classmethod
+    def init(cls, path, accumulators=ACCUMULATORS):
+        path = Path(path)
+        source, node = read_tree(path)
+        return cls(path, accumulators=tuple(accumulator() for accumulator in accumulators)).walk(node, source.splitlines())
+
+    def open(self, node, parent, lines):
+        name = 'module' if parent is None else parent.qualify(node.name)
+        scope = Scope(name, node, parent)
+        for accumulator in self.accumulators:
+            accumulator.start(scope, lines)
+        self.scopes.append(scope)
+        return scope
+
+    def close(self, scope):
+        for accumulator in self.accumulators:
+            accumulator.finish(scope)
+        scope.state = {}
+
+    def walk(self, tree, source_lines):
+        lines = LineIndex(source_lines)
+        stack = [(tree, None, None, tuple(None for __ in self.accumulators))]
+        while stack:
+            node, parent, scope, states = stack.pop()
+            if node is None:  # all nodes of the scope are visited
+                self.close(scope)
+                continue
+            if is_docstring(node, parent):
+                continue
+            if isinstance(node, SCOPES):
+                scope = self.open(node, scope, lines)
+                stack.append((None, None, scope, None))
+            visited = [accumulator.visit(node, state, scope) for accumulator, state in zip(self.accumulators, states)]
+            children = [(child, node, scope, tuple(overrides.get(child, default) for default, overrides in visited)) for child in ast.iter_child_nodes(node)]
+            stack.extend(reversed(children))
+        return self
+
+    def record(self):
+        return {'path': str(self.path), 'scopes': [{'name': scope.name, 'kind': scope.kind, 'lineno': getattr(scope.reflection, 'lineno', 0), **scope.metrics} for scope in self.scopes]}
+
+
+if __name__ == '__main__':
+    with main(Metrics) as records:
+        LOCs = Counter()
+        effort = Counter()
+        cyclomatic = Counter()
+        cognitive = Counter()
+        researched = 0
+        for researched, record in enumerate(records, 1):
+            for scope in record['scopes']:
+                name = f'{record["path"]}:{scope["name"]}'
+                print(name, scope['kind'], 'LOC', scope['LOC'], 'SLOC', scope['SLOC'], 'LLOC', scope['LLOC'], 'volume', round(scope['halstead']['volume'], 2), 'cyclomatic', scope['cyclomatic'], 'cognitive', scope['cognitive'])
+                if scope['kind'] != 'Module':
+                    name = f'{name} line {scope["lineno"]}'  # property getters and setters, conditional definitions share qualified names
+                    LOCs[name] = scope['LOC']
+                    effort[name] = int(scope['halstead']['effort'])
+                    cyclomatic[name] = scope['cyclomatic']
+                    cognitive[name] = scope['cognitive']
+
+        most_common = 1
+        print('files researched:', researched)
+        print('longest:', LOCs.most_common(most_common))
+        print('max effort:', effort.most_common(most_common))
+        print('max cyclomatic:', cyclomatic.most_common(most_common))
+        print('max cognitive:', cognitive.most_common(most_common))
@@ -0,0 +1,188 @@
+"""Compact node table: AST of a file flattened into arrays instead of one ASTObject per node"""
+from array import array
+from pathlib import Path
+import ast
+
+from base import main, read_tree, start_line, end_line, LineIndex, LogicalLines
+
+
+class NodeTable:
+    """
+    Nodes of one file in pre-order, node i is described by items i of the arrays:
+    parent, first_child, next_sibling (-1 if absent) and start, end source lines.
+    """
+    __slots__ = 'path', 'source_lines', 'lines', 'logical', 'reflections', 'parent', 'first_child', 'next_sibling', 'start', 'end'
+
+    def __init__(self, tree, path=None, source_lines=None):
+        self.path = path
+        self.source_lines = source_lines or []
+        self.lines = LineIndex(self.source_lines)
+        self.logical = LogicalLines(tree)
+        self.reflections = []
+        self.parent = array('i')
+        stack = [(tree, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(self.reflections)
+            self.reflections.append(node)
+            self.parent.append(parent)
+            stack.extend((child, index) for child in reversed(list(ast.iter_child_nodes(node))))
+
+        size = len(self.reflections)
+        self.first_child = array('i', [-1]) * size
+        self.next_sibling = array('i', [-1]) * size
+        for index in range(size - 1, 0, -1):  # later siblings first, so links keep source order
+            parent = self.parent[index]
+            self.next_sibling[index] = self.first_child[parent]
+            self.first_child[parent] = index
+        self.start = array('i', (start_line(node) for node in self.reflections))
+        self.end = array('i', (end_line(node) for node in self.reflections))
+
+    def __len__(self):
+        return len(self.reflections)
+
+    @property
+    def root(self):
+        return Node(self, 0)
+
+    @classmethod
+    def init(cls, path):
+        path = Path(path)
+        source, node = read_tree(path)
+        return cls(node, path, source.splitlines())
+
+    def record(self):
+        return self.root.record()
+
+
+class Node:
+    """ View of a node of NodeTable with metrics of base.ASTObject and definitions of stats.ASTObject """
+    __slots__ = 'table', 'index'
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __repr__(self):
+        return f'{self.index} -> {self.reflection.__class__}'
+
+    @property
+    def reflection(self):
+        return self.table.reflections[self.index]
+
+    @property
+    def parent(self):
+        parent = self.table.parent[self.index]
+        return None if parent < 0 else Node(self.table, parent)
+
+    @property
+    def children(self):
+        children, child = [], self.table.first_child[self.index]
+        while child >= 0:
+            children.append(Node(self.table, child))
+            child = self.table.next_sibling[child]
+        return children
+
+    @property
+    def path(self):
+        return self.table.path
+
+    @property
+    def docstring(self):
+        return (ast.get_docstring(self.reflection) or '').strip()
+
+    @property
+    def _start(self):
+        return self.table.start[self.index]
+
+    @property
+    def _end(self):
+        return self.table.end[self.index]
+
+    @property
+    def raw_lines(self):
+        return self.table.source_lines[max(0, self._start - 1): self._end]
+
+    @property
+    def LOC(self):
+        return self._end - max(0, self._start - 1)
+
+    @property
+    def spaces(self):
+        return self.table.lines.spaces(self._start, self._end)
+
+    @property
+    def comments(self):
+        return self.table.lines.comments(self._start, self._end)
+
+    @property
+    def SLOC(self):
+        return self.LOC - self.comments - self.spaces
+
+    @property
+    def LLOC(self):
+        return self.table.logical[self.reflection]
+
+    @property
+    def is_class(self):
+        return isinstance(self.reflection, ast.ClassDef)
+
+    @property
+    def is_function(self):
+        return isinstance(self.reflection, (ast.FunctionDef, ast.AsyncFunctionDef))
+
+    @property
+    def classes(self):
+        return [child for child in self.children if child.is_class]
+
+    @property
+    def functions(self):
+        return [] if self.is_class else [child for child in self.children if child.is_function]
+
+    @property
+    def methods(self):
+        return [child for child in self.children if child.is_function] if self.is_class else []
+
+    @property
+    def imports(self):
+        """ import statements inside of the node in order of stats.ASTObject.imports: imports of the node, then imports inside of each child """
+        imports, stack = [], [self.index]
+        first_child, next_sibling, reflections = self.table.first_child, self.table.next_sibling, self.table.reflections
+        while stack:
+            index = stack.pop()
+            children = []
+            child = first_child[index]
+            while child >= 0:
+                children.append(child)
+                child = next_sibling[child]
+            imports.extend(Node(self.table, child) for child in children if isinstance(reflections[child], (ast.Import, ast.ImportFrom)))
+            stack.extend(reversed(children))
+        return imports
+
+    @property
+    def imported(self):
+        return [name.name for node in self.imports for name in node.reflection.names]
+
+    def record(self):
+        return {'path': str(self.path), 'LOC': self.LOC, 'spaces': self.spaces, 'comments': self.comments, 'SLOC': self.SLOC, 'LLOC': self.LLOC, 'docstring': self.docstring}
+
+    def stats_record(self):
+        """ record of stats.ASTObject """
+        return {
+            'path': str(self.path), 'imports': len(self.imports), 'imported': self.imported,
+            'classes': [(_class.reflection.name, len(_class.methods)) for _class in self.classes],
+            'functions': [(function.reflection.name, len(function.functions)) for function in self.functions]}
+
+
+class StatsTable(NodeTable):
+    """ NodeTable with records of stats.ASTObject, for the stats CLI """
+    __slots__ = ()
+
+    def record(self):
+        return self.root.stats_record()
+
+
+if __name__ == '__main__':
+    with main(NodeTable) as records:
+        for record in records:
+            print(record['path'], 'LOC', record['LOC'], 'blank lines', record['spaces'], 'comments', record['comments'], 'SLOC', record['SLOC'], 'LLOC', record['LLOC'])
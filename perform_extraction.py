@@ -1,61 +1,177 @@
 from pathlib import Path
+import ast
+import copy
 
 from extract_and_hint import extract_and_hint
+from graph import DependencyGraph
+from resolver import LEGACY
 
-from utils import parser, RESULTS, SOURCES, base_init
+from utils import parser, RESULTS, SOURCES, open_outputs, packages, make_packages, copy_files, pool_imap
+from store import ModuleStore
+from unused_imports import without_unused_imports
+from edits import EditBuffer
 
-import autoflake
-from contextlib import redirect_stderr
-import io
-import os
 
+def bound_names(tree):
+    """
+    names bound at the top level of the module, in compound statements too, None if any name can be bound:
+    by `from module import *` or by a module __getattr__
+    """
+    names, stack = set(), list(tree.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == '__getattr__':
+                return None
+            names.add(node.name)
+            stack.extend(node.decorator_list)
+            continue
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any(alias.name == '*' for alias in node.names):
+                return None
+            names.update(alias.asname or alias.name.partition('.')[0] for alias in node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        if not isinstance(node, ast.Lambda):
+            stack.extend(ast.iter_child_nodes(node))
+    return names
 
-def perform_extraction(paths=None):
 
-    collected_deps, collected_hints, refactor_goals = extract_and_hint(paths)
+def entry_points(entries, index, files, store):
+    """
+    (file name, name in the file or None) of entries: paths of files, dotted names of modules or of names defined in them.
+    File names are spelled like in files, the extracted files, entries not found in them are an error,
+    like names the file does not define or re-export.
+    """
+    known = {Path(filename).resolve(): filename for filename in files}
+    for entry in entries:
+        found, member = Path(entry), None
+        if not entry.endswith('.py'):
+            kind, found = index.resolve(entry)
+            found, member = (found, index.member(entry)) if kind == LEGACY else (None, None)
+        filename = found and known.get(Path(found).resolve())
+        if filename is None:
+            raise ValueError(f'Entry point {entry} is not found in {SOURCES}')
+        if member is not None:
+            names = bound_names(store[filename].tree)
+            if names is not None and member not in names:
+                raise ValueError(f'Entry point {entry}: {member} is not defined in {filename}')
+        yield filename, member
 
-    destination = RESULTS / 'extracted'
-    breakpoint()
-    for filename in collected_deps['imported'].keys():
-        source = Path(filename)
-        destination = RESULTS / 'extracted' / source.absolute().relative_to(SOURCES.absolute())
-        base_init(destination)
-        destination.write_text(source.read_text())
 
-    for filename, hints in refactor_goals.items():
-        source = Path(filename)
-        with source.open(mode='r', encoding='utf-8') as sourcefile:
-            destination = RESULTS / 'extracted' / source.absolute().relative_to(SOURCES.absolute())
-            base_init(destination)
-            lines = {}
+def reexports(tree, names):
+    """
+    source of package __init__ reduced to its top-level imports of names,
+    None if one of names is bound otherwise, like a fallback import in try or an import in if, then the __init__ is needed whole
+    """
+    lines, bound = [], set()
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            aliases = [alias for alias in statement.names if (alias.asname or alias.name) in names]
+            if aliases:
+                statement = copy.copy(statement)
+                statement.names = aliases
+                lines.append(f'{ast.unparse(statement)}\n')
+                bound.update(alias.asname or alias.name for alias in aliases)
+            continue
+        stack = [statement]
+        while stack:  # imports of compound statements, not of functions and classes
+            node = stack.pop()
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and any((alias.asname or alias.name) in names for alias in node.names):
+                return None
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                stack.extend(ast.iter_child_nodes(node))
+    return ''.join(lines) if bound >= set(names) else None
 
+
+def extracted_files(graph, points, store):
+    """
+    {file name: WHOLE or source of the reduced package __init__} of files needed by entry points,
+    an __init__ which can not be reduced is needed whole, with all files it imports
+    """
+    points = list(points)
+    while True:
+        extracted = graph.subset(points)
+        reduced = {filename: reexports(store[filename].tree, needed) for filename, needed in extracted.items() if needed is not DependencyGraph.WHOLE}
+        whole = [(filename, None) for filename, source in reduced.items() if source is None]
+        if not whole:
+            return {**extracted, **reduced}
+        points += whole
+
+
+def replaceable(name, imported_classes, requirements):
+    """ hint name is imported from legacy files, not from requirements """
+    imported_module = imported_classes.get(name) or imported_classes.get(name.partition('.')[0])
+    return bool(imported_module) and imported_module.partition('.')[0] not in requirements
+
+
+def replace_hints(buffer, hints, names):
+    """ edits of buffer putting the string 'typing.Any' in the place of hints of names """
+    for name, lineno, start_col, end_col, end_lineno in hints:
+        if name in names:
+            start, end = buffer.offset(lineno, start_col), buffer.offset(end_lineno, end_col)
+            current = buffer.text(start, end).strip().strip(b"'\"`").decode()
+            if current != f'{name}'.strip():
+                raise ValueError(f'{name} does not match {current}')
+            buffer.replace(start, end, b"'typing.Any'")
+    return buffer
+
+
+def rewrite(item):
+    """ write the edited source once, with unused imports removed if clean: True if unused imports were removed """
+    destination, source, clean = item
+    fixed = without_unused_imports(source) if clean else source
+    destination.write_bytes(fixed)
+    return fixed is not source
+
+
+def perform_extraction(paths=None, cache=None, incremental=False, stream=None, jobs=1, entries=()):
+    """
+    Copy legacy files with imported hints replaced by typing.Any and unused imports removed.
+    Without entries all files found by extract_and_hint are copied, with entries only files they need,
+    package __init__ files needed only for names they re-export are reduced to their top-level imports of these names.
+    Edits of hints and removal of unused imports are done in memory, every extracted file is written once.
+    Every file is parsed once, by this process or with jobs > 1 by a worker, rewrites need only the source bytes,
+    only trees of entry files and of package __init__ files reduced for entries are parsed again here.
+    """
+    store = ModuleStore()  # sources read by extract_and_hint are copied without reading them again
+    collected_deps, collected_hints, refactor_goals = extract_and_hint(paths, cache, incremental, stream, store, jobs)
+
+    extracted = dict.fromkeys(collected_deps['imported'], DependencyGraph.WHOLE)
+    if entries:
+        extracted = extracted_files(collected_deps['graph'], entry_points(entries, collected_deps['index'], collected_deps['imported'], store), store)
+        print('files needed by entry points', len(extracted), 'of', len(collected_deps['imported']))
+
+    destinations = {filename: RESULTS / 'extracted' / Path(filename).absolute().relative_to(SOURCES.absolute()) for filename in extracted}
+    make_packages(packages(destinations.values()))
+    for filename, needed in extracted.items():
+        if needed is not DependencyGraph.WHOLE:
+            destinations[filename].write_text(needed)
+
+    rewrites, copies = [], []
+    for filename, needed in extracted.items():
+        if needed is not DependencyGraph.WHOLE:
+            continue
+        buffer = EditBuffer(store[filename].source)
+        if filename in refactor_goals:
             imported_classes = collected_deps['imported'][filename]['classes']
-            for name, lineno, start_col, end_col in collected_hints[filename]:
-                imported_module = imported_classes.get(name) or imported_classes.get(name.partition('.')[0])
-                if name in hints and imported_module and imported_module.partition('.')[0] not in collected_deps['requirements']:
-                    lines[lineno] = lines.get(lineno, []) + [(name, start_col, end_col)]
-
-            with destination.open(mode='w', encoding='utf-8') as destination:
-                for index, line in enumerate(sourcefile, 1):
-                    if index in lines:
-                        for name, start_col, end_col in sorted(lines[index], key=lambda val: val[2], reverse=True):
-                            before, current, after = line[:start_col], line[start_col:end_col], line[end_col:]
-                            current = current.strip().strip("'\"`")
-                            if current != f'{name}'.strip():
-                                raise ValueError(f'{name} does not match {current}')
-                            line = "'".join([before, 'typing.Any', after]) # i put any in the place of the hint
-
-                    destination.writelines([line])
-
-    # '    with (RESULTS / 'autoflake_unused_imports.txt').open(mode='w', encoding='utf-8') as autoflake_results:
-    #         with (RESULTS / 'autoflake_unused_imports_errors.txt').open(mode='w', encoding='utf-8') as autoflake_errors:'
-    for file_for_strip_tags in (RESULTS / 'extracted').rglob('*.py'):
-        if file_for_strip_tags.name != '__init__.py':
-            os.system(f'autoflake --remove-all-unused-imports --in-place --verbose {file_for_strip_tags.absolute()}')
+            names = {name for name, *__ in collected_hints[filename] if name in refactor_goals[filename] and replaceable(name, imported_classes, collected_deps['requirements'])}
+            replace_hints(buffer, collected_hints[filename], names)
+        clean = Path(filename).name != '__init__.py'  # unused imports of package __init__ are re-exports
+        if buffer or clean:
+            rewrites.append((destinations[filename], buffer.apply(), clean))
+        else:
+            copies.append((filename, destinations[filename]))
+    copy_files(copies)
+    cleaned = sum(pool_imap(rewrite, rewrites, jobs))
+    print('files with unused imports removed', cleaned, 'of', sum(clean for *__, clean in rewrites))
 
     print('files extracted, hints removed')
 
 
 if __name__ == '__main__':
     init_args = parser.parse_args()
-    perform_extraction(init_args.filenames)
\ No newline at end of file
+    with open_outputs(init_args) as (stream, cache):
+        perform_extraction(init_args.filenames, cache, init_args.incremental, stream, jobs=init_args.jobs, entries=init_args.entry)
@@ -1,18 +1,59 @@
 import ast
 from collections import Counter
-from utils import parser, SOURCES, RESULTS, base_init
-
-
-def extract_nodes(filepath):
-    for node in ast.walk(ast.parse(filepath.read_text(), filename=filepath.name)):
+from functools import partial
+from utils import parser, SOURCES, RESULTS, base_init, open_outputs
+from store import ModuleStore
+
+
+FIELDS = ('dataclass', 'NamedTuple', 'TypedDict')  # decorators and bases making fields of annotations in the class body
+BLOCKS = ('body', 'orelse', 'finalbody', 'handlers', 'cases')  # fields of statements holding statements
+
+
+def named(node):
+    """ last name of decorator or base: dataclass of @dataclasses.dataclass(frozen=True) """
+    if isinstance(node, ast.Call):
+        node = node.func
+    return getattr(node, 'attr', None) or getattr(node, 'id', None)
+
+
+def hint_annotations(tree):
+    """
+    (node, annotation) of every hint in tree: arguments, returns and annotated assignments, fields of dataclasses are not hints.
+    Hints are parts of statements only, so expressions are not walked.
+    """
+    fields, stack = set(), [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            arguments = node.args
+            for arg in (*arguments.posonlyargs, *arguments.args, arguments.vararg, *arguments.kwonlyargs, arguments.kwarg):
+                if arg and arg.annotation:
+                    yield arg, arg.annotation
+            if node.returns:
+                yield node, node.returns
+        elif isinstance(node, ast.ClassDef) and any(named(item) in FIELDS for item in (*node.decorator_list, *node.bases)):
+            fields.update(id(item) for item in node.body if isinstance(item, ast.AnnAssign))
+        elif isinstance(node, ast.AnnAssign) and id(node) not in fields:
+            yield node, node.annotation
+        for block in BLOCKS:
+            stack.extend(getattr(node, block, ()))
+
+
+def extract_nodes(filepath, store=None):
+    store = store or ModuleStore()
+    for node in ast.walk(store[filepath].tree):
         if not isinstance(node, (ast.Import, ast.ImportFrom, ast.Module)):
             yield node
 
-def ast_module_loader(module, collector, definitions_counter):
-    for node in extract_nodes(module):
+def hints_record(module, store=None):
+    """ picklable hints of the module: (hints, definitions, (chars, lines)), hint is (name, lineno, col_offset, end_col_offset, end_lineno) """
+    store = store or ModuleStore()
+    collector, definitions = [], []
+    for node in extract_nodes(module, store):
         if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
-            definitions_counter[type(node).__name__].update([(module, node.lineno, node.name)])
+            definitions.append((type(node).__name__, node.lineno, node.name))
         handle_node(node, collector)
+    return set(collector), definitions, (len(store[module].text), len(store[module].text.splitlines()))
 
 def collect_from_node(node, collector):
     node_id = ''
@@ -71,7 +112,7 @@ def collect_from_node(node, collector):
         print(node, 'err')
         ...
 
-    collector.append((node_id, node.lineno, node.col_offset, node.end_col_offset))
+    collector.append((node_id, node.lineno, node.col_offset, node.end_col_offset, node.end_lineno))
 
 def handle_node(node, collector):
     if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
@@ -99,7 +140,8 @@ def handle_node(node, collector):
     if hasattr(node, 'returns') and node.returns:
         collect_from_node(node.returns, collector)
 
-def hints_collector(paths=None):
+def hints_collector(paths=None, cache=None, stream=None, store=None):
+    store = store or ModuleStore()
     base_init(RESULTS)
     paths = paths or [SOURCES]
     base_init(*paths)
@@ -108,10 +150,19 @@ def hints_collector(paths=None):
     definitions_counter = {"FunctionDef": Counter(), "ClassDef": Counter()}
     filecounter = 0
     for filecounter, module in enumerate((filename for path in paths for filename in ([path] if path.is_file() else path.rglob('*.py'))), start=1):
-        collector = []
-        ast_module_loader(module, collector, definitions_counter)
-        type_hints_collector[f'{module}'] = set(collector)
-        string_counter[f'{module}'] = len(module.read_text()), len(module.read_text().splitlines())
+        record = store[module].results.pop('hints', None)  # collected by a worker which parsed the file for imports
+        if record is not None:
+            hints, definitions, lengths = cache.set(cache.digest(module, 'hints', content=store[module].source), record, 'hints', module) if cache else record
+        elif cache:
+            hints, definitions, lengths = cache.fetch(module, 'hints', partial(hints_record, store=store), content=store[module].source)
+        else:
+            hints, definitions, lengths = hints_record(module, store)
+        for kind, lineno, name in definitions:
+            definitions_counter[kind].update([(module, lineno, name)])
+        type_hints_collector[f'{module}'] = hints
+        if stream:
+            stream.emit({'kind': 'hints', 'path': str(module), 'hints': hints, 'definitions': definitions, 'chars': lengths[0], 'lines': lengths[1]})
+        string_counter[f'{module}'] = lengths
 
     report = RESULTS / 'hints_type_report.txt'
     with report.open(mode='w', encoding='utf-8') as destination:
@@ -149,5 +200,5 @@ def hints_collector(paths=None):
 
 if __name__ == '__main__':
     init_args = parser.parse_args()
-    hints_collector(init_args.filenames)
-
+    with open_outputs(init_args) as (stream, cache):
+        hints_collector(init_args.filenames, cache, stream)
@@ -0,0 +1,85 @@
+"""Resolution of dotted module names to legacy files, with the layout of SOURCES scanned once"""
+from pathlib import Path
+import os
+import sys
+
+from utils import SOURCES
+
+LEGACY, MISSING, THIRD_PARTY, STDLIB = 'legacy', 'missing', 'third-party', 'stdlib'
+STDLIB_MODULES = frozenset((*sys.stdlib_module_names, *sys.builtin_module_names))
+
+
+class ModuleIndex:
+    """
+    Names of all files and folders under root, collected by one os.scandir walk.
+    resolve maps a dotted name to (kind, value) with the probes of ast_extractor.check_legacy,
+    answered by the index and memoized, so no filesystem call is made while resolving:
+        (LEGACY, path of file to load), (MISSING, path of module),
+        (THIRD_PARTY or STDLIB, top level name) for names outside of root.
+    Symlinked folders and junctions are followed, a link to a folder above it is not, so link loops end.
+    """
+
+    def __init__(self, root=SOURCES):
+        self.root = Path(root)
+        self.entries = set()  # parts of paths relative to root
+        self.resolved = {}
+        self.scan()
+
+    def scan(self):
+        stack = [((), frozenset())]  # parts of folder, real paths of folders above it
+        while stack:
+            parts, above = stack.pop()
+            folder = self.root.joinpath(*parts)
+            real = os.path.realpath(folder)
+            if real in above:  # link to a folder above, a loop
+                continue
+            try:
+                iterator = os.scandir(folder)
+            except OSError:
+                continue
+            above = above | {real}
+            with iterator as entries:
+                for entry in entries:
+                    self.entries.add((*parts, entry.name))
+                    try:
+                        if entry.is_dir():
+                            stack.append(((*parts, entry.name), above))
+                    except OSError:
+                        continue
+        return self
+
+    def exists(self, *parts):
+        return parts in self.entries
+
+    def resolve(self, name):
+        resolved = self.resolved.get(name)
+        if resolved is None:
+            resolved = self.resolved[name] = self._resolve(name)
+        return resolved
+
+    def member(self, name):
+        """ name defined in the legacy file name resolves to, None if name is the module of the file itself """
+        kind, found = self.resolve(name)
+        if kind != LEGACY:
+            return None
+        parts, module = Path(*name.split('.')).parts, found.relative_to(self.root).with_suffix('').parts
+        if module[-1] == '__init__':
+            module = module[:-1]
+        return parts[len(module)] if len(parts) > len(module) else None
+
+    def _resolve(self, name):
+        module = Path(*name.split('.'))
+        parts = module.parts
+        top = parts[0]
+        if not self.exists(top):
+            return (STDLIB if top in STDLIB_MODULES else THIRD_PARTY), Path(top).stem
+
+        if self.exists(*parts):  # import from module
+            return LEGACY, self.root.joinpath(*parts, '__init__.py')
+        if self.exists(*parts[:-1], f'{parts[-1]}.py'):  # import from file
+            return LEGACY, self.root.joinpath(*parts[:-1], f'{parts[-1]}.py')
+        if self.exists(*parts[:-1]):  # name imported from package
+            return LEGACY, self.root.joinpath(*parts[:-1], '__init__.py')
+        if self.exists(*parts[:-2], f'{parts[-2]}.py'):  # name imported from file
+            return LEGACY, self.root.joinpath(*parts[:-2], f'{parts[-2]}.py')
+        return MISSING, module
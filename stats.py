@@ -4,6 +4,7 @@ from dataclasses import dataclass, field
 import ast
 
 from base import ASTObject as baseASTObject, main
+from nodes import StatsTable
 counter = []
 
 @dataclass
@@ -38,9 +39,16 @@ class ASTObject(baseASTObject):
 
     @property
     def is_docstring(self):
-        docstring = self.parent and self.parent.is_docstring
-        if docstring:
-            return docstring
+        """ value of the docstring the node is or is inside of, parents are checked in a loop, the outermost docstring wins """
+        docstring, node = None, self.parent
+        while node is not None:
+            docstring = node.docstring_value or docstring
+            node = node.parent
+        return docstring or self.docstring_value
+
+    @property
+    def docstring_value(self):
+        """ value of the string if the node itself is a docstring expression """
         if self.is_expr and isinstance(self.reflection.value, ast.Constant) and isinstance(self.reflection.value.value, str) and self.reflection.value  and self.parent and hasattr(self.parent.reflection, 'body') and self.parent.reflection.body:
             return self.reflection is self.parent.reflection.body[0] and self.reflection.value.value
 
@@ -51,11 +59,12 @@ class ASTObject(baseASTObject):
     @property
     def have_imports(self):
         """ if declared functions or classes internal """
-        return len(self._imports) or any(child.have_imports for child in self.children)
+        return len(self.materialize()._imports) or any(child.have_imports for child in self.children)
 
     @property
     def imports(self):
         """ return all imports """
+        self.materialize()
         imports_pipe = (child.imports for child in self.children if child.imports)
         return *self._imports, *(child_import for imports in imports_pipe for child_import in imports)
 
@@ -101,7 +110,7 @@ class ASTObject(baseASTObject):
             return node
     @property
     def has_importlib(self):
-        return self.importlib or any(child.has_importlib for child in self.children)
+        return self.materialize().importlib or any(child.has_importlib for child in self.children)
 
     @property
     def is_class(self):
@@ -137,11 +146,11 @@ class ASTObject(baseASTObject):
 
     @property
     def classes(self):
-        return self._classes
+        return self.materialize()._classes
 
     @property
     def functions(self):
-        return [] if self.is_class else self._functions
+        return [] if self.is_class else self.materialize()._functions
 
     # TODO: add generators definitions
     def collect_generators(self, node):
@@ -150,7 +159,7 @@ class ASTObject(baseASTObject):
 
     @property
     def methods(self):
-        return self._functions if self.is_class else []
+        return self.materialize()._functions if self.is_class else []
 
     @property
     def is_module(self):
@@ -168,46 +177,52 @@ class ASTObject(baseASTObject):
                 if isinstance(child_node, (ast.Yield, ast.YieldFrom)):
                     return True
 
+    def record(self):
+        return {
+            'path': str(self.path), 'imports': len(self.imports), 'imported': list(self.imported),
+            'classes': [(_class.reflection.name, len(_class.methods)) for _class in self.classes],
+            'functions': [(function.reflection.name, len(function.functions)) for function in self.functions]}
+
 if __name__ == '__main__':
-    objects= main(ASTObject)
-
-    imported = Counter()
-    imports = Counter()
-    classes = Counter()
-    functions = Counter()
-    imported_objects = Counter()
-    for obj in objects:
-        imports.update({str(obj.path): len(obj.imports)})
-        imported_objects.update({str(obj.path): len(obj.imported)})
-        imported.update(obj.imported)
-        for _class in obj.classes:
-            classes.update({f'{obj.path}.{_class.reflection.name}': len(_class.methods)})
-        for function in obj.functions:
-            functions.update({f'{obj.path}.{function.reflection.name}': len(function.functions)})
-
-    most_common = 1
-    print('objects researched:', len(objects))
-    print('max import lines:', imports.most_common(most_common))
-    print('max imported objects:', imported_objects.most_common(most_common))
-    print('mostly imported:', imported.most_common(most_common))
-
-    print('classes:', len(classes))
-    print('functions', len(functions))
-    print('max methods:', classes.most_common(most_common))
-    print('max function compositions:', functions.most_common(most_common))
-
-
-    # if root.classes:
-    #     cls =root.classes[0]
-    #     if cls.children:
-    #         child = cls.children[1]
-    #         print(child.is_docstring)
-    #         print(child.raw_lines)
-    #         print(ast.unparse(child.reflection))
-
-    # print('collected', counter)
-    # counter = []
-    # for child in ast.walk(root.reflection):
-    #     counter += [child]
-
-    # print('walked', counter)
+    with main(StatsTable) as records:  # same records as ASTObject, without a wrapper per node
+        imported = Counter()
+        imports = Counter()
+        classes = Counter()
+        functions = Counter()
+        imported_objects = Counter()
+        researched = 0
+        for researched, record in enumerate(records, 1):
+            imports.update({record['path']: record['imports']})
+            imported_objects.update({record['path']: len(record['imported'])})
+            imported.update(record['imported'])
+            for name, methods in record['classes']:
+                classes.update({f'{record["path"]}.{name}': methods})
+            for name, compositions in record['functions']:
+                functions.update({f'{record["path"]}.{name}': compositions})
+
+        most_common = 1
+        print('objects researched:', researched)
+        print('max import lines:', imports.most_common(most_common))
+        print('max imported objects:', imported_objects.most_common(most_common))
+        print('mostly imported:', imported.most_common(most_common))
+
+        print('classes:', len(classes))
+        print('functions', len(functions))
+        print('max methods:', classes.most_common(most_common))
+        print('max function compositions:', functions.most_common(most_common))
+
+
+        # if root.classes:
+        #     cls =root.classes[0]
+        #     if cls.children:
+        #         child = cls.children[1]
+        #         print(child.is_docstring)
+        #         print(child.raw_lines)
+        #         print(ast.unparse(child.reflection))
+
+        # print('collected', counter)
+        # counter = []
+        # for child in ast.walk(root.reflection):
+        #     counter += [child]
+
+        # print('walked', counter)
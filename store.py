@@ -0,0 +1,47 @@
+"""Parsed modules shared by the stages of one extraction run: every file is read and parsed once"""
+from dataclasses import dataclass, field
+from pathlib import Path
+import ast
+
+
+@dataclass
+class ParsedModule:
+    """
+    Source bytes of a file, its text and tree are made on first use.
+    results are picklable analyses of the file made by worker processes, so this process does not parse the file for them.
+    """
+    path: Path
+    source: bytes
+    _text: str = None
+    _tree: ast.Module = None
+    results: dict = field(default_factory=dict)  # {namespace: result}
+
+    @property
+    def text(self):
+        """ same as path.read_text(), new lines are translated like in text mode """
+        if self._text is None:
+            self._text = self.source.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        return self._text
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = ast.parse(self.text, filename=self.path.name)
+        return self._tree
+
+
+class ModuleStore:
+    """ ParsedModule for every path used in the run, paths are compared as absolute paths """
+
+    def __init__(self):
+        self.modules = {}
+
+    def __contains__(self, path):
+        return Path(path).absolute() in self.modules
+
+    def __getitem__(self, path):
+        key = Path(path).absolute()
+        module = self.modules.get(key)
+        if module is None:
+            module = self.modules[key] = ParsedModule(Path(path), key.read_bytes())
+        return module
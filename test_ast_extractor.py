@@ -0,0 +1,76 @@
+import ast
+from collections import Counter
+from pathlib import Path
+import subprocess
+
+import pytest
+
+from ast_extractor import load_closure, extract_all_imports
+from remove_hints import hints_collector
+from resolver import ModuleIndex
+from store import ModuleStore
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    """ package where every module is imported by several names and from several files, paths are relative like SOURCES """
+    monkeypatch.chdir(tmp_path)
+    package = Path('legacy', 'pkg')
+    package.mkdir(parents=True)
+    (package / '__init__.py').write_text('')
+    (package / 'd.py').write_text('X = Y = 1\n')
+    (package / 'c.py').write_text('from pkg.d import X\nfrom pkg.d import Y\nA = B = 1\n')
+    (package / 'b.py').write_text('from pkg.c import A\nfrom pkg.d import X\ndef f(a: A) -> X: ...\n')
+    (package / 'a.py').write_text('from pkg.b import *\nfrom pkg.c import A, B\nimport pkg.d\n')
+    return [package / name for name in ('a.py', 'b.py', 'c.py', 'd.py')]
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """ arguments of ast.parse calls made by this process, not by workers """
+    calls, parse = [], ast.parse
+    monkeypatch.setattr(ast, 'parse', lambda *args, **kwargs: calls.append(args) or parse(*args, **kwargs))
+    return calls
+
+
+def collector_of(store, hints=False):
+    return {'imports': Counter(), 'requirements': Counter(), 'imported': {}, 'depth': {}, 'cache': None, 'stream': None,
+            'store': store, 'index': ModuleIndex(Path('legacy')), 'previous': {}, 'records': {}, 'hints': hints, 'parsed': {}}
+
+
+def test_files_parsed_by_workers_are_not_parsed_again(files, parses):
+    collector = load_closure(files, collector_of(ModuleStore()), jobs=2)
+
+    assert set(collector['records']) == {str(file) for file in files}
+    assert parses == []
+
+
+def test_files_are_parsed_once_in_process(files, parses):
+    collector = load_closure(files, collector_of(ModuleStore()), jobs=1)
+
+    assert set(collector['records']) == {str(file) for file in files}
+    assert len(parses) == len(files)
+
+
+def test_hints_of_files_parsed_by_workers(files, parses):
+    store = ModuleStore()
+    load_closure(files, collector_of(store, hints=True), jobs=2)
+    collected = hints_collector(files, store=store)
+
+    assert parses == []
+    assert {name for name, *__ in collected[str(files[1])]} == {'A', 'X'}
+
+
+def test_incremental_run_parses_files_reverted_since_a_dirty_run(files):
+    git = lambda *args: subprocess.run(['git', '-C', 'legacy', '-c', 'user.name=test', '-c', 'user.email=test@test', *args], check=True, capture_output=True)
+    git('init')
+    git('add', '.')
+    git('commit', '-m', 'legacy')
+    module = files[3]
+    module.write_text('import collections\nX = Y = 1\n')
+    extract_all_imports([files[0]], incremental=True)
+    git('checkout', str(module.relative_to('legacy')))
+
+    collector = extract_all_imports([files[0]], incremental=True)
+
+    assert 'collections' not in collector['imports']
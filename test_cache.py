@@ -0,0 +1,49 @@
+import pytest
+
+from cache import ResultCache, MISSING
+
+
+@pytest.fixture
+def module(tmp_path):
+    path = tmp_path / 'module.py'
+    path.write_text('x = 1\n')
+    return path
+
+
+def rows(cache):
+    return cache.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+def test_result_of_unchanged_file_is_found(tmp_path, module):
+    with ResultCache(tmp_path / 'cache.sqlite3') as cache:
+        assert cache.fetch(module, 'lines', lambda path: path.read_text()) == 'x = 1\n'
+    with ResultCache(tmp_path / 'cache.sqlite3') as cache:
+        assert cache.fetch(module, 'lines', lambda path: pytest.fail('computed again')) == 'x = 1\n'
+        assert cache.hits == 1
+
+
+def test_results_of_other_version_are_deleted(tmp_path, module):
+    with ResultCache(tmp_path / 'cache.sqlite3', version='1') as cache:
+        cache.fetch(module, 'lines', lambda path: path.read_text())
+    with ResultCache(tmp_path / 'cache.sqlite3', version='2') as cache:
+        assert rows(cache) == 0
+
+
+def test_results_of_removed_files_are_deleted(tmp_path, module):
+    with ResultCache(tmp_path / 'cache.sqlite3') as cache:
+        cache.fetch(module, 'lines', lambda path: path.read_text())
+    module.unlink()
+    with ResultCache(tmp_path / 'cache.sqlite3') as cache:
+        assert rows(cache) == 0
+
+
+def test_result_of_new_content_replaces_old_one(tmp_path, module):
+    with ResultCache(tmp_path / 'cache.sqlite3') as cache:
+        old = cache.digest(module, 'lines')
+        cache.set(old, 'x = 1\n', 'lines', module)
+        cache.set(cache.digest(module, 'lines', options='other'), 'other', 'lines', module)
+        module.write_text('x = 2\n')
+        cache.fetch(module, 'lines', lambda path: path.read_text())
+
+        assert rows(cache) == 1
+        assert cache.get(old) is MISSING
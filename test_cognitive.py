@@ -0,0 +1,19 @@
+import pytest
+
+from cognitive import ASTObject
+
+
+@pytest.fixture
+def deep(tmp_path):
+    """ expression nested deeper than the recursion limit allows to walk recursively """
+    path = tmp_path / 'deep.py'
+    path.write_text('def f(a):\n    """ docstring """\n    if a or a:\n        return ' + ' + '.join(['a'] * 1200) + '\n')
+    return path
+
+
+@pytest.mark.parametrize('options', [{}, {'lazy': True}, {'statements': True}])
+def test_deeply_nested_code(deep, options):
+    record = ASTObject.init(deep, **options).record()
+
+    assert record['functions'] == {'f': 2}  # if and one boolean operator
+
@@ -0,0 +1,45 @@
+import ast
+
+import pytest
+
+from edits import BOM, EditBuffer
+
+
+def test_edits_of_several_passes_are_applied_in_order_of_position():
+    buffer = EditBuffer(b'a = 1\nb = 2\n')
+    buffer.replace(6, 7, b'c').replace(0, 1, b'xyz')
+
+    assert buffer.apply() == b'xyz = 1\nc = 2\n'
+
+
+def test_overlapping_edits_are_an_error():
+    buffer = EditBuffer(b'a = 1\nb = 2\n')
+    buffer.replace(0, 5, b'pass').replace(4, 7)
+
+    with pytest.raises(ValueError, match='overlaps'):
+        buffer.apply()
+
+
+def test_adjacent_edits_do_not_overlap():
+    buffer = EditBuffer(b'abc')
+    buffer.replace(0, 1, b'x').replace(1, 2, b'y')
+
+    assert buffer.apply() == b'xyc'
+
+
+def test_span_of_node_on_several_lines():
+    source = b'x = f(\n    1,\n    2,\n)\ny = 3\n'
+    buffer = EditBuffer(source)
+    call = ast.parse(source).body[0].value
+
+    assert buffer.text(*buffer.span(call)) == b'f(\n    1,\n    2,\n)'
+    assert buffer.replace(*buffer.span(call), b'0').apply() == b'x = 0\ny = 3\n'
+
+
+def test_columns_are_utf8_bytes_after_bom():
+    source = BOM + 'é = "ü"\nv = 1\n'.encode()
+    buffer = EditBuffer(source)
+    value = ast.parse(source).body[0].value
+
+    assert buffer.text(*buffer.span(value)) == '"ü"'.encode()
+    assert buffer.replace(*buffer.span(value), b'2').apply() == BOM + 'é = 2\nv = 1\n'.encode()
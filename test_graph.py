@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+
+from graph import DependencyGraph
+from resolver import ModuleIndex
+
+
+def imports(module, *names):
+    return 'ImportFrom', module, tuple((name, None) for name in names), ''
+
+
+@pytest.fixture
+def graph(tmp_path):
+    """ a -> b -> c -> a is a cycle, c imports itself too, d imports the package which re-exports a name of e """
+    package = tmp_path / 'pkg'
+    package.mkdir()
+    for name in ('__init__', 'a', 'b', 'c', 'd', 'e'):
+        (package / f'{name}.py').touch()
+    records = {
+        str(package / 'a.py'): [imports('pkg.b', 'B'), imports('json', 'loads')],
+        str(package / 'b.py'): [imports('pkg.c', 'C')],
+        str(package / 'c.py'): [imports('pkg.a', 'A'), imports('pkg.c', 'C')],
+        str(package / 'd.py'): [imports('pkg', 'E')],
+        str(package / '__init__.py'): [imports('pkg.e', 'E')],
+        str(package / 'e.py'): [],
+    }
+    return DependencyGraph.build(records, ModuleIndex(tmp_path))
+
+
+def name(graph, file):
+    return next(name for name in graph.names if Path(name).name == file)
+
+
+def test_nodes_are_files_and_requirements(graph):
+    assert sorted(Path(name).name for name in graph.names) == ['__init__.py', 'a.py', 'b.py', 'c.py', 'd.py', 'e.py', 'json']
+    assert len(graph) == 7
+    assert len(graph.offsets) == len(graph.symbol_offsets) == 8
+    assert graph.bindings(name(graph, 'a.py')) == {'B': 'pkg.b', 'loads': 'json'}
+
+
+def test_cycles_and_back_edges(graph):
+    cycles = graph.cycles()
+
+    assert [sorted(Path(graph.names[id]).name for id in cycle) for cycle in cycles] == [['a.py', 'b.py', 'c.py']]
+    cut = graph.back_edges(cycles[0])
+    assert len(cut) == 2  # c -> a and c -> c
+    assert {(Path(graph.names[source]).name, Path(graph.names[target]).name) for source, target in cut} <= {('c.py', 'a.py'), ('c.py', 'c.py'), ('a.py', 'b.py'), ('b.py', 'c.py')}
+    remaining = {(source, target) for source in cycles[0] for target in graph.imports(source) if target in cycles[0]} - set(cut)
+    assert all(source != target for source, target in remaining)
+
+
+def test_single_module_importing_itself_is_a_cycle(tmp_path):
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'm.py').touch()
+    graph = DependencyGraph.build({str(tmp_path / 'pkg' / 'm.py'): [imports('pkg.m', 'x')]}, ModuleIndex(tmp_path))
+
+    assert graph.cycles() == [[0]]
+    assert graph.back_edges([0]) == [(0, 0)]
+
+
+def test_subset_follows_reexported_names(graph):
+    needed = graph.subset([(name(graph, 'd.py'), None)])
+
+    assert needed[name(graph, '__init__.py')] == {'E'}
+    assert needed[name(graph, 'e.py')] is DependencyGraph.WHOLE
+    assert name(graph, 'a.py') not in needed
@@ -0,0 +1,50 @@
+import ast
+from pathlib import Path
+
+from halstead import ASTObject, HalsteadCounts, Tokens, TOKENS
+
+
+SOURCE = '''
+def area(width, height):
+    """ docstrings are not counted """
+    return width * height + 1
+'''
+
+
+def test_counts_intern_into_given_table():
+    tokens, known = Tokens(), len(TOKENS)
+    counts = HalsteadCounts(ast.parse('x = y + 1'), tokens=tokens)
+
+    assert counts.tokens is tokens
+    assert len(tokens) == 5
+    assert len(TOKENS) == known
+    assert tokens.named(counts.measures(counts.tree)['operands']) == {'x': 1, 'y': 1, '1': 1}
+
+
+def test_separate_tables_give_same_metrics():
+    first, second = HalsteadCounts(ast.parse(SOURCE), tokens=Tokens()), HalsteadCounts(ast.parse(SOURCE), tokens=Tokens())
+    metrics = [{key: value for key, value in counts.measures(counts.tree).items() if key not in ('operators', 'operands')} for counts in (first, second)]
+
+    assert metrics[0] == metrics[1]
+    assert first.tokens.named(first.measures(first.tree)['operators']) == second.tokens.named(second.measures(second.tree)['operators'])
+
+
+def test_tree_uses_table_of_its_root():
+    tokens, known = Tokens(), len(TOKENS)
+    root = ASTObject('root', ast.parse(SOURCE), path=Path('area.py'), tokens=tokens).setup()
+    function = root.children[0]
+    function.visit(function.reflection)
+
+    assert function.table is tokens
+    assert root.counts.tokens is tokens
+    assert root.halstead['n2'] == 3  # width, height and 1, the docstring is skipped
+    assert len(TOKENS) == known
+
+
+def test_long_literals_are_interned_by_digest():
+    tokens = Tokens()
+    text = 'x' * (Tokens.LIMIT + 1)
+
+    assert tokens.literal(text) == tokens.literal('x' * (Tokens.LIMIT + 1))
+    assert tokens.literal(text) != tokens.literal('y' * (Tokens.LIMIT + 1))
+    assert tokens.name(tokens.literal(text)).endswith(f'<{len(text)} chars {tokens.keys[tokens.literal(text)][1][:4].hex()}>')
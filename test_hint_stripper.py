@@ -0,0 +1,49 @@
+import ast
+
+from hint_stripper import strip_hints
+
+
+def stripped(tmp_path, source):
+    path = tmp_path / 'module.py'
+    path.write_text(source)
+    count, error = strip_hints(path)
+    assert error is None
+    result = path.read_text()
+    ast.parse(result)
+    return count, result
+
+
+def test_hints_of_arguments_and_returns(tmp_path):
+    source = 'def f(a: int, *args: str, b: list[int] = None, **kwargs: dict) -> bool:\n    return a\n'
+
+    assert stripped(tmp_path, source) == (5, 'def f(a, *args, b = None, **kwargs):\n    return a\n')
+
+
+def test_fields_of_dataclasses_keep_their_hints(tmp_path):
+    source = 'from dataclasses import dataclass\n\n@dataclass\nclass A:\n    x: int\n    y: str = ""\n\nclass B:\n    x: int = 1\n'
+
+    count, result = stripped(tmp_path, source)
+
+    assert count == 1
+    assert result == source.replace('    x: int = 1', '    x = 1')
+
+
+def test_bare_annotation_becomes_pass(tmp_path):
+    source = 'class A:\n    x: int\n\ndef f():\n    y: int\n'
+
+    assert stripped(tmp_path, source) == (2, 'class A:\n    pass\n\ndef f():\n    pass\n')
+
+
+def test_parenthesized_annotations(tmp_path):
+    source = 'def f(a: (int), b: (\n    str | None\n)) -> (bool):\n    x: (int) = a\n'
+
+    assert stripped(tmp_path, source) == (4, 'def f(a, b):\n    x = a\n')
+
+
+def test_file_without_hints_is_not_written(tmp_path):
+    path = tmp_path / 'module.py'
+    path.write_text('x = 1\n')
+    mtime = path.stat().st_mtime_ns
+
+    assert strip_hints(path) == (0, None)
+    assert path.stat().st_mtime_ns == mtime
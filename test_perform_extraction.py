@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import pytest
+
+from perform_extraction import entry_points
+from resolver import ModuleIndex
+from store import ModuleStore
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    package = Path('legacy', 'pkg')
+    package.mkdir(parents=True)
+    (package / '__init__.py').write_text('from pkg.module import run as start\n')
+    (package / 'module.py').write_text('try:\n    import json\nexcept ImportError:\n    json = None\n\ndef run(): ...\n')
+    return [str(package / '__init__.py'), str(package / 'module.py')]
+
+
+def points(entries, files):
+    return list(entry_points(entries, ModuleIndex(Path('legacy')), files, ModuleStore()))
+
+
+def test_entry_points_of_defined_and_reexported_names(files):
+    assert points(['pkg.module.run', 'pkg.module.json', 'pkg.start', 'pkg.module'], files) == [
+        (files[1], 'run'), (files[1], 'json'), (files[0], 'start'), (files[1], None)]
+
+
+@pytest.mark.parametrize('entry', ['pkg.module.nonexistent', 'pkg.run', 'pkg.missing.run'])
+def test_unknown_entry_points_are_an_error(files, entry):
+    with pytest.raises(ValueError):
+        points([entry], files)
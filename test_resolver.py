@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from resolver import ModuleIndex, LEGACY, MISSING, STDLIB, THIRD_PARTY
+
+
+@pytest.fixture
+def root(tmp_path):
+    """ legacy/lib is a link to a package outside of legacy, like a junction made by mklink /J """
+    (tmp_path / 'real' / 'lib' / 'util').mkdir(parents=True)
+    (tmp_path / 'real' / 'lib' / '__init__.py').write_text('')
+    (tmp_path / 'real' / 'lib' / 'util' / '__init__.py').write_text('')
+    (tmp_path / 'real' / 'lib' / 'util' / 'helpers.py').write_text('def helper(): ...\n')
+    (tmp_path / 'legacy').mkdir()
+    try:
+        os.symlink(tmp_path / 'real' / 'lib', tmp_path / 'legacy' / 'lib', target_is_directory=True)
+    except OSError:
+        pytest.skip('symlinks are not allowed')
+    return tmp_path / 'legacy'
+
+
+def test_symlinked_package(root):
+    index = ModuleIndex(root)
+
+    assert index.resolve('lib.util') == (LEGACY, root / 'lib' / 'util' / '__init__.py')
+    assert index.resolve('lib.util.helpers.helper') == (LEGACY, root / 'lib' / 'util' / 'helpers.py')
+    assert index.member('lib.util.helpers.helper') == 'helper'
+    assert index.resolve('lib.other.name')[0] == MISSING
+
+
+def test_link_loop_is_scanned_once(root):
+    os.symlink(root / 'lib', root / 'lib' / 'util' / 'loop', target_is_directory=True)
+    index = ModuleIndex(root)
+
+    assert index.exists('lib', 'util', 'loop')
+    assert not index.exists('lib', 'util', 'loop', 'util')
+    assert index.resolve('lib.util.helpers')[0] == LEGACY
+
+
+def test_names_outside_of_root(root):
+    index = ModuleIndex(root)
+
+    assert index.resolve('os.path') == (STDLIB, 'os')
+    assert index.resolve('requests.api') == (THIRD_PARTY, 'requests')
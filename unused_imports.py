@@ -0,0 +1,56 @@
+"""Unused imports removed in process, files are fixed like `autoflake --remove-all-unused-imports --in-place`"""
+from pathlib import Path
+import io
+import tokenize
+
+import autoflake
+
+from utils import parser, RESULTS, base_init, pool_imap
+
+
+def without_unused_imports(source):
+    """ source bytes fixed by autoflake, decoded and encoded like autoflake reads and writes files """
+    try:
+        encoding = tokenize.detect_encoding(io.BytesIO(source).readline)[0]
+        text = source.decode(encoding)
+    except (LookupError, SyntaxError, UnicodeDecodeError):
+        encoding = 'latin-1'
+        text = source.decode(encoding)
+    fixed = autoflake.fix_code(text, remove_all_unused_imports=True)
+    return source if fixed == text else fixed.encode(encoding)
+
+
+def remove_unused_imports(path):
+    """ autoflake fix of one file: (True if file is changed, error message or None) """
+    try:
+        source = Path(path).read_bytes()
+        fixed = without_unused_imports(source)
+        if fixed is source:
+            return False, None
+        Path(path).write_bytes(fixed)
+    except OSError as error:
+        return False, f'{error}'
+    return True, None
+
+
+def unused_imports_collector(paths, jobs=1):
+    """
+    Remove unused imports of files in `jobs` worker processes, one interpreter for all files instead of one per file.
+    Result of a file is the same as of autoflake command line: its own fix_code is used.
+    """
+    paths = list(paths)
+    fixed, errors = 0, []
+    for path, (changed, error) in zip(paths, pool_imap(remove_unused_imports, paths, jobs)):
+        fixed += changed
+        if error:
+            print('error', error, path)
+            errors.append(str(path))
+    print('files with unused imports removed', fixed, 'of', len(paths))
+    return errors
+
+
+if __name__ == '__main__':
+    init_args = parser.parse_args()
+    base_init(RESULTS)
+    errors = unused_imports_collector((filename for path in init_args.filenames for filename in ([path] if path.is_file() else Path(path).rglob('*.py'))), init_args.jobs)
+    (RESULTS / 'errors_unused_imports.txt').write_text('\n'.join(errors), newline='\n')
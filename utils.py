@@ -1,8 +1,16 @@
 from pathlib import Path
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from itertools import islice
+import json
+import shutil
+import sys
 
 SOURCES = Path('legacy/')
 RESULTS = Path('logs/')
+VERSION = '4'  # change it when results of analysis change, cached results of other versions are not used, ResultCache adds a digest of the code too
 
 def validate_filename(filename):
     """Validate filenames to obtain type-hints in files."""
@@ -17,6 +25,11 @@ def validate_filename(filename):
 parser = ArgumentParser(prog='Entry point for hints collector', description='This ist script to check type hints in any python file or folder', epilog='Type hints collected')
 parser.add_argument('filenames', type=validate_filename, nargs='*', help='Path to the folder or file to collect type-hints. By default hints are collected in : `%(default)s` in current directory.', default=[SOURCES])
 parser.add_argument("-o", "--output", type=str, help='Path to the folder where you can store RESULTS. By default RESULTS are collected in : `%(default)s` in current directory .', default=RESULTS, required=False)
+parser.add_argument('--cache', action='store_true', help='Reuse imports and hints of unchanged files stored in RESULTS from previous runs.')
+parser.add_argument('--jsonl', type=str, help='Stream one JSON record per analyzed file into this file while the scan is running, `-` for stdout, then other output goes to stderr.', default=None, required=False)
+parser.add_argument('--jobs', '-j', type=int, default=1, help='Parse each level of imported files in N worker processes. By default: %(default)s, parse in current process.')
+parser.add_argument('--entry', action='append', default=[], help='Extract only what this entry point needs: path of a file, dotted name of a module or of a name in it. Can be repeated.')
+parser.add_argument('--incremental', action='store_true', help='Parse again only files changed in SOURCES (git) since the previous extraction.')
 
 def parents(path):
     root = Path()
@@ -44,3 +57,129 @@ def base_init(*routes):
         for module in path.rglob('*.py'):
             for parent in parents(module):
                 initiate(parent)
+
+
+def packages(files):
+    """ folders of files with all their parents, each folder once, parents before children """
+    folders = {}
+    for file in files:
+        folder = Path(file).parent
+        if folder in folders:
+            continue
+        root = Path()
+        for directory in folder.parts:
+            root = root / directory
+            folders[root] = None
+    return list(folders)
+
+
+def make_packages(folders):
+    """ like base_init for known folders: every folder is made once with an __init__.py, existing files are kept """
+    for folder in folders:
+        folder.mkdir(exist_ok=True)
+        try:
+            (folder / '__init__.py').touch(exist_ok=False)
+        except FileExistsError:
+            pass
+
+
+def copy_files(pairs, jobs=None):
+    """ copy bytes of (source, destination) pairs in `jobs` threads, folders of destinations should exist """
+    pairs = list(pairs)
+    if pairs:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for __ in executor.map(shutil.copyfile, *zip(*pairs)):  # raises the first error of a copy
+                pass
+    return len(pairs)
+
+
+def map_chunk(function, chunk):
+    return [function(item) for item in chunk]
+
+
+def pool_imap(function, items, jobs=1, chunksize=16):
+    """Like pool_map, but results are yielded as soon as they are ready, still in order of items.
+    Only 2 * jobs chunks are in work at once, so memory does not grow with the number of items."""
+    if jobs <= 1:
+        yield from map(function, items)
+        return
+    items = iter(items)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * jobs and (chunk := list(islice(items, chunksize))):
+                pending.append(executor.submit(map_chunk, function, chunk))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+def pool_map(function, items, jobs=1, chunksize=16):
+    """Map function over items in `jobs` worker processes, results keep order of items.
+    function and results should be picklable, with jobs <= 1 everything is done in current process."""
+    return list(pool_imap(function, items, jobs, chunksize))
+
+
+def serializable(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)  # paths and other objects
+
+
+class JSONLines:
+    """
+    Stream of records written as JSON, one per line, each flushed as soon as it is emitted,
+    so other jobs can consume results while the scan is running.
+    Path `-` is stdout, path can be an open text stream too, without path records are dropped.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.stream = None
+        self.count = 0
+
+    def __enter__(self):
+        if self.path == '-':
+            self.stream = sys.stdout
+        elif hasattr(self.path, 'write'):
+            self.stream = self.path
+        elif self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.stream = open(self.path, mode='w', encoding='utf-8')
+        return self
+
+    def __exit__(self, *args):
+        if self.stream is not None and self.path != '-' and self.stream is not self.path:  # only files opened here are closed
+            self.stream.close()
+        self.stream = None
+
+    def emit(self, record):
+        if self.stream is not None:
+            self.stream.write(json.dumps(record, default=serializable) + '\n')
+            self.stream.flush()
+            self.count += 1
+        return record
+
+    def tee(self, records):
+        """ emit every record and pass it on """
+        for record in records:
+            yield self.emit(record)
+
+
+def records_stdout(jsonl):
+    """ (path or stream for JSONLines, context of printed output) of --jsonl: with `-` stdout is kept for the records, printed output goes to stderr """
+    if jsonl == '-':
+        return sys.stdout, redirect_stdout(sys.stderr)
+    return jsonl, nullcontext()
+
+
+@contextmanager
+def open_outputs(args):
+    """
+    JSONLines stream of --jsonl and ResultCache of --cache, None without --cache, for the scripts using parser.
+    With `--jsonl -` stdout holds only the records, everything printed by the script goes to stderr.
+    """
+    from cache import ResultCache  # cache module uses RESULTS and VERSION of utils
+    jsonl, printed = records_stdout(args.jsonl)
+    with JSONLines(jsonl) as stream, printed, (ResultCache() if args.cache else nullcontext()) as cache:
+        yield stream, cache